@@ -1,84 +1,689 @@
 #!/usr/bin/env python3
 
-import http.client
-import base64
-import json
-import re
-from urllib.parse import urlencode, unquote # urlparse, parse_qs
+import sys
 from datetime import datetime, time, timezone, timedelta
+from time import perf_counter, sleep
+
+class LazyModule:
+  # stands for a module until its first use, then imports it and takes
+  # its place; commands import only what they use, 'help' next to nothing
+
+  def __init__(self, name):
+    self.name = name
+
+  def __getattr__(self, attr):
+    top = __import__(self.name) # the package, with the submodule imported
+    globals()[top.__name__] = top
+    return getattr(top, attr)
+
+http = LazyModule('http.client')
+urllib = LazyModule('urllib.parse')
+concurrent = LazyModule('concurrent.futures')
+base64 = LazyModule('base64')
+json = LazyModule('json')
+re = LazyModule('re')
+array = LazyModule('array')
+io = LazyModule('io')
+tempfile = LazyModule('tempfile')
+tracemalloc = LazyModule('tracemalloc')
+threading = LazyModule('threading')
+random = LazyModule('random')
+secrets = LazyModule('secrets')
+socket = LazyModule('socket')
+signal = LazyModule('signal')
+heapq = LazyModule('heapq')
+select = LazyModule('select')
+sqlite3 = LazyModule('sqlite3')
+zlib = LazyModule('zlib')
+errno = LazyModule('errno')
+asyncio = LazyModule('asyncio')
 
 #http://docs.tobesoft.com/advanced_development_guide_nexacro_17_ko#a5e1e2fb1080ae59
 def nexacro_ssv_encode(info, enc="utf-8"):
-  rs = '\x1e' # record separator
-  return f"SSV:{enc}{rs}" + rs.join(f"{f}={v}" for (f,v) in info)
+  # body of variables info [(vid, val)], see NexacroSsvEncoder
+  return NexacroSsvEncoder(enc).encode(info)
+
+class LazyPattern:
+  # compiled on the first match, not at startup
+  def __init__(self, pattern, dotall=False):
+    self.source = pattern
+    self.dotall = dotall
+    self.pattern = None
+
+  def fullmatch(self, s):
+    if self.pattern is None:
+      self.pattern = re.compile(self.source, re.S if self.dotall else 0)
+    return self.pattern.fullmatch(s)
 
-RE_H  = re.compile(b'SSV(:(?P<enc>utf-8|en_Us))?')
-RE_DH = re.compile(b'Dataset:(?P<did>\w+)')
-RE_V  = re.compile(b'(?P<vid>\w+)(:(?P<type>\w+)(\((?P<len>\d+)\))?)?(=(?P<val>.*))?', re.S)
-RE_CC = re.compile(b'(?P<ccid>\w+)(:(?P<type>\w+)(\((?P<len>\d+)\))?)?(=(?P<val>.*))?', re.S)
-RE_C  = re.compile(b'(?P<cid>\w+)(:(?P<type>\w+)(\((?P<len>\d+)\))?)?(:(?P<styp>\w+))?(:(?P<stxt>\w+))?')
+RE_H  = LazyPattern(b'SSV(:(?P<enc>utf-8|en_Us))?')
+RE_DH = LazyPattern(b'Dataset:(?P<did>\w+)')
+RE_V  = LazyPattern(b'(?P<vid>\w+)(:(?P<type>\w+)(\((?P<len>\d+)\))?)?(=(?P<val>.*))?', dotall=True)
 
 def regmat(pattern, s, name):
   m = pattern.fullmatch(s)
   if m: return m
   raise ValueError(f"malformed {name}: '{s}'")
 
-def nexacro_ssv_decode_dataset(vs, i):
-  def checki():
-    if len(vs) <= i: raise ValueError(f"imcomplete dataset at {i}'th record")
-
-  m = regmat(RE_DH, vs[i], 'dataset header')
-  did = m.group('did')
-  i += 1
-
-  checki()
-  ccis = {}
-  if vs[i][0:8] == b'_Const_\x1f':
-    for s in vs[i].split(b'\x1f')[1:]:
-      m = regmat(RE_CC, s, 'dataset const column info')
-      ccis[m.group('ccid')] = m.group('val')
-    i += 1
-
-  checki()
-  cis = []
-  regmat(re.compile(b'^_RowType_\x1f'), vs[i][0:10], 'column infos')
-  for s in vs[i].split(b'\x1f')[1:]:
-    m = regmat(RE_C, s, 'dataset column info')
-    cis.append(m.group('cid'))
-  i += 1
-
-  checki()
-  rec = []
-  while vs[i]:
-    if vs[i][0] not in b'NIUDO' or vs[i][1:2] != b'\x1f':
-      raise ValueError(f"malformed dataset row '{vs[i]}'")
-    rec.append([None if x == b'\x03' else x for x in vs[i][2:].split(b'\x1f')])
-    i += 1
-    checki()
-
-  i += 1
-  return ((did, rec, ccis, cis), i)
-
-def nexacro_ssv_decode(bs):
-  vs = bs.split(b'\x1e')
-
-  m = regmat(RE_H, vs[0], 'header')
-  encoding = m.group('enc') or 'ascii'
-
-  ret = {}
-  i = 1
-  while i < len(vs):
-    if i == len(vs)-1 and vs[i] == b'': break
-    elif vs[i][0:7] == b'Dataset':
-      ((did, rec, ccis, cis), i) = nexacro_ssv_decode_dataset(vs, i)
-      ret[did] = (rec, ccis, cis)
-    else:
-      m = regmat(RE_V, vs[i], 'variable')
-      ret[m.group('vid')] = m.group('val')
-      i += 1
+def isword(s): # bytes counterpart of r'\w+'
+  return s != b'' and s.replace(b'_', b'a').isalnum()
+
+def nexacro_ssv_column_info(s, name, parts=4):
+  # tokenizes 'cid[:type[(len)]][:styp][:stxt]' into (cid, type, len)
+  # with plain splits; cheaper than a regex match per column
+  ts = s.split(b':', parts)
+  if len(ts) > parts or not all(isword(t) for t in ts[2:]):
+    raise ValueError(f"malformed {name}: '{s}'")
+
+  cid = ts[0]
+  (typ, paren, size) = ts[1].partition(b'(') if len(ts) > 1 else (None, b'', b'')
+  if not isword(cid) or typ is not None and not isword(typ):
+    raise ValueError(f"malformed {name}: '{s}'")
+  if paren:
+    if size[-1:] != b')' or not size[:-1].isdigit():
+      raise ValueError(f"malformed {name}: '{s}'")
+    size = int(size[:-1])
+  else:
+    size = None
+
+  return (cid, typ, size)
+
+def nexacro_ssv_const_info(s, name):
+  # tokenizes 'ccid[:type[(len)]][=val]' into (ccid, val)
+  (head, eq, val) = s.partition(b'=')
+  (ccid, _, _) = nexacro_ssv_column_info(head, name, parts=2)
+  return (ccid, val if eq else None)
+
+def ssv_str(v):
+  s = v.decode('utf-8')
+  return sys.intern(s) if len(s) <= 16 else s # codes repeat in every row
+
+# column container & converter for each declared type, for columnar decoding
+# cells are '\x03' (null) or bytes, which float() and int() parse as they are
+SSV_COLUMN_TYPES = {
+  b'INT':        ('q', int),
+  b'FLOAT':      ('d', float),
+  b'DECIMAL':    ('d', float),
+  b'BIGDECIMAL': ('d', float),
+  b'BLOB':       (None, bytes),
+  # STRING, DATE, DATETIME, TIME and undeclared types
+  None:          (None, ssv_str),
+}
 
+SSV_CHUNK_SIZE = 16 * 1024
+
+class NexacroSsvDecoder:
+  # push decoder; feed() it chunks as they arrive and get back events
+  #   ('variable', vid, val)
+  #   ('dataset', did, ccis, cis)  header of a dataset, rows follow
+  #   ('row', did, values)
+  #   ('end', did)                 dataset is complete
+  # records spanning chunk boundaries are held until their separator arrives
+  #
+  # datasets listed in columns ({did: [cid or index, ...]}) are decoded
+  # into typed columns instead of row events; only the selected columns are
+  # materialized, by their declared types (see SSV_COLUMN_TYPES), and the
+  # dataset yields ('columns', did, {cid or index: column}) before its end.
+  # numeric nulls are nan in float columns, and turn int columns into lists.
+  # with raw, selected columns are lists of undecoded bytes (or None).
+
+  def __init__(self, columns=None, raw=False):
+    self.pending = [] # pieces of the record not terminated yet
+    self.state = 'header'
+    self.did = None
+    self.ccis = None
+    self.nrec = 0
+    self.columns = columns or {}
+    self.raw = raw
+    self.selected = None # [(index, converter, column key)] if columnar
+    self.cols = None
+
+  def feed(self, chunk):
+    events = []
+    parts = chunk.split(b'\x1e')
+    if len(parts) == 1:
+      self.pending.append(chunk)
+      return events
+
+    self.pending.append(parts[0])
+    self.record(b''.join(self.pending), events)
+    for rec in parts[1:-1]:
+      self.record(rec, events)
+    self.pending = [parts[-1]]
+    return events
+
+  def close(self):
+    events = []
+    rec = b''.join(self.pending)
+    self.pending = []
+    if rec or self.state != 'top': # trailing empty record is not a variable
+      self.record(rec, events)
+    if self.state == 'header':
+      raise ValueError("malformed header: ''")
+    if self.state != 'top':
+      raise ValueError(f"imcomplete dataset at {self.nrec}'th record")
+    return events
+
+  def record(self, rec, events):
+    self.nrec += 1
+
+    if self.state == 'header':
+      regmat(RE_H, rec, 'header')
+      self.state = 'top'
+
+    elif self.state == 'top':
+      if rec[0:7] == b'Dataset':
+        m = regmat(RE_DH, rec, 'dataset header')
+        self.did = m.group('did')
+        self.ccis = {}
+        self.state = 'columns'
+      else:
+        m = regmat(RE_V, rec, 'variable')
+        events.append(('variable', m.group('vid'), m.group('val')))
+
+    elif self.state == 'columns':
+      if rec[0:8] == b'_Const_\x1f':
+        for s in rec.split(b'\x1f')[1:]:
+          (ccid, val) = nexacro_ssv_const_info(s, 'dataset const column info')
+          self.ccis[ccid] = val
+        return
+
+      if rec[0:10] != b'_RowType_\x1f':
+        raise ValueError(f"malformed column infos: '{rec[0:10]}'")
+      infos = [nexacro_ssv_column_info(s, 'dataset column info')
+        for s in rec.split(b'\x1f')[1:]]
+      cis = [cid for (cid, _, _) in infos]
+      events.append(('dataset', self.did, self.ccis, cis))
+      if self.did in self.columns:
+        self.select(infos, self.columns[self.did])
+      self.state = 'rows'
+
+    elif rec: # self.state == 'rows'
+      if rec[0] not in b'NIUDO' or rec[1:2] != b'\x1f':
+        raise ValueError(f"malformed dataset row '{rec}'")
+      if self.selected is None:
+        events.append(('row', self.did,
+          [None if x == b'\x03' else x for x in rec[2:].split(b'\x1f')]))
+      else:
+        self.append(rec[2:].split(b'\x1f', self.maxsplit))
+
+    else: # empty record terminates the dataset
+      if self.selected is not None:
+        events.append(('columns', self.did, self.cols))
+        self.selected = self.cols = None
+      events.append(('end', self.did))
+      self.state = 'top'
+
+  def select(self, infos, keys):
+    cis = [cid for (cid, _, _) in infos]
+    self.selected = []
+    self.cols = {}
+    for key in keys:
+      try:
+        j = key if isinstance(key, int) else cis.index(key)
+        (_, typ, _) = infos[j]
+      except (ValueError, IndexError):
+        raise ValueError(f"dataset '{self.did}' has no column '{key}'")
+      (code, conv) = (None, bytes) if self.raw else SSV_COLUMN_TYPES.get(typ, SSV_COLUMN_TYPES[None])
+      self.selected.append((j, conv, key))
+      self.cols[key] = array.array(code) if code else []
+    # cells after the last selected one are left unsplit
+    self.maxsplit = max((j for (j, _, _) in self.selected), default=0) + 1
+
+  def append(self, cells):
+    cols = self.cols
+    for (j, conv, key) in self.selected:
+      v = cells[j] if j < len(cells) else b'\x03'
+      if v == b'\x03' or v == b'' and conv in (int, float):
+        col = cols[key]
+        if isinstance(col, array.array):
+          if col.typecode == 'd':
+            col.append(float('nan'))
+            continue
+          cols[key] = col = col.tolist()
+        col.append(None)
+      else:
+        cols[key].append(conv(v))
+
+def nexacro_ssv_iterdecode(src, chunk_size=SSV_CHUNK_SIZE, columns=None, raw=False):
+  # pull decoder over bytes, memoryview or a readable such as http.client.HTTPResponse,
+  # parsing each chunk as soon as it is received
+  decoder = NexacroSsvDecoder(columns, raw)
+  if isinstance(src, (bytes, bytearray)):
+    yield from decoder.feed(src)
+  elif isinstance(src, memoryview):
+    # e.g. a body in an mmap of ResponseArchive, copied a chunk at a time
+    # as it is decoded, never as a whole
+    for i in range(0, len(src), chunk_size):
+      yield from decoder.feed(src[i:i + chunk_size].tobytes())
+  else:
+    read = getattr(src, 'read1', src.read) # returns what has arrived so far
+    for chunk in iter(lambda: read(chunk_size), b''):
+      yield from decoder.feed(chunk)
+    # HTTPResponse.read1 leaves a drained response open, blocking the
+    # next request on the connection; read() closes it
+    yield from decoder.feed(src.read())
+  yield from decoder.close()
+
+def nexacro_ssv_decode(src, chunk_size=SSV_CHUNK_SIZE, columns=None, raw=False):
+  # {vid: val, did: (rows, ccis, cis)}; (columns, ccis, cis) for datasets
+  # selected in columns, see NexacroSsvDecoder
+  return nexacro_ssv_collect(nexacro_ssv_iterdecode(src, chunk_size, columns, raw), {})
+
+def nexacro_ssv_collect(events, ret):
+  # adds decoder events to ret of nexacro_ssv_decode, returns ret
+  for ev in events:
+    if ev[0] == 'variable':
+      ret[ev[1]] = ev[2]
+    elif ev[0] == 'dataset':
+      (_, did, ccis, cis) = ev
+      ret[did] = ([], ccis, cis)
+    elif ev[0] == 'row':
+      ret[ev[1]][0].append(ev[2])
+    elif ev[0] == 'columns':
+      (_, did, cols) = ev
+      ret[did] = (cols,) + ret[did][1:]
   return ret
 
+class NexacroSsvEncoder:
+  # counterpart of NexacroSsvDecoder, writing a body into one bytearray
+  # reused from body to body:
+  #   begin(), then variable(vid, val) and for each dataset
+  #   dataset(did, infos, consts), row(values, rowtype) per row and end(),
+  #   then getvalue() for the body as bytes, or view() for a memoryview
+  #   valid until the next begin()
+  # vid and column infos are as declared on the wire, e.g. 'ErrorCode:int'
+  # or 'TEMP:STRING(4)', checked once and kept encoded. values are str,
+  # bytes, int, float or None (null, '\x03' in rows); SSV has no escapes,
+  # so values holding a separator or '\x03' raise ValueError.
+  # bodies of variables only, as requests are, go faster by template()
+
+  def __init__(self, enc="utf-8"):
+    self.enc = enc
+    self.head = b'SSV:' + enc.encode('ascii')
+    self.buf = bytearray(1024)
+    self.n = 0
+    self.names = {} # vid or info -> encoded
+    self.ncols = None # columns of the open dataset
+
+  def write(self, b):
+    end = self.n + len(b)
+    if end > len(self.buf):
+      size = max(end, 2 * len(self.buf))
+      try:
+        self.buf.extend(bytes(size - len(self.buf)))
+      except BufferError: # last view still held, left to its holder
+        buf = bytearray(size)
+        buf[:self.n] = self.buf[:self.n]
+        self.buf = buf
+    self.buf[self.n:end] = b
+    self.n = end
+
+  def name(self, s, what, parts):
+    b = self.names.get(s)
+    if b is None:
+      b = s.encode('ascii') if isinstance(s, str) else bytes(s)
+      nexacro_ssv_column_info(b, what, parts)
+      self.names[s] = b
+    return b
+
+  def value(self, v):
+    if v is None: return b'\x03'
+    if isinstance(v, str):
+      b = v.encode(self.enc)
+    elif isinstance(v, (bytes, bytearray)):
+      b = v
+    elif isinstance(v, (int, float)) and not isinstance(v, bool):
+      return str(v).encode('ascii')
+    else:
+      raise TypeError(f"SSV value should be str, bytes or number but is {v.__class__.__name__}")
+    if b'\x1e' in b or b'\x1f' in b or b'\x03' in b:
+      raise ValueError(f"SSV value cannot hold separators: {v!r}")
+    return b
+
+  def begin(self):
+    if self.ncols is not None:
+      raise ValueError("dataset not ended")
+    self.n = 0
+    self.write(self.head)
+
+  def variable(self, vid, val):
+    # None val leaves out '=', as the decoder reads it back
+    if self.ncols is not None:
+      raise ValueError("variable inside a dataset")
+    rec = b'\x1e' + self.name(vid, 'variable', 2)
+    self.write(rec if val is None else rec + b'=' + self.value(val))
+
+  def dataset(self, did, infos, consts=()):
+    # consts [(info, val)] are the '_Const_' columns
+    b = did.encode('ascii')
+    if not isword(b) or self.ncols is not None:
+      raise ValueError(f"malformed dataset id or dataset not ended: '{did}'")
+    self.write(b'\x1eDataset:' + b)
+    if consts:
+      self.write(b'\x1e_Const_' + b''.join(b'\x1f' + self.name(ci, 'dataset const column info', 2)
+        + (b'' if v is None else b'=' + self.value(v)) for (ci, v) in consts))
+    self.write(b'\x1e_RowType_' + b''.join(b'\x1f' + self.name(ci, 'dataset column info', 4)
+      for ci in infos))
+    self.ncols = len(infos)
+
+  def row(self, values, rowtype='N'):
+    if self.ncols is None:
+      raise ValueError("row outside of a dataset")
+    if len(rowtype) != 1 or rowtype not in 'NIUDO':
+      raise ValueError(f"unknown row type '{rowtype}'")
+    if len(values) != self.ncols:
+      raise ValueError(f"row of {len(values)} values for {self.ncols} columns")
+    self.write(b'\x1e' + rowtype.encode('ascii') + b'\x1f' + b'\x1f'.join(map(self.value, values)))
+
+  def end(self):
+    # the empty record which terminates the dataset
+    if self.ncols is None:
+      raise ValueError("no dataset to end")
+    self.write(b'\x1e')
+    self.ncols = None
+
+  def view(self):
+    if self.ncols is not None:
+      raise ValueError("dataset not ended")
+    return memoryview(self.buf)[:self.n]
+
+  def getvalue(self):
+    return bytes(self.view())
+
+  def encode(self, info):
+    # body of variables info [(vid, val)]
+    self.begin()
+    for (vid, val) in info: self.variable(vid, val)
+    return self.getvalue()
+
+  def template(self, info):
+    # function of keyword values to the body of variables info [(vid, val)],
+    # where val None is filled in by the keyword vid and others, the same
+    # every body, are encoded into the template once. a body is one
+    # %-format and one encode, its values checked at once: a body of
+    # variables only holds a '\x1e' per variable and no '\x1f' or '\x03'
+    parts = [self.head.decode('ascii')]
+    slots = []
+    for (vid, val) in info:
+      self.name(vid, 'variable', 2)
+      if val is None:
+        parts.append(f"\x1e{vid}=%s")
+        slots.append(vid)
+      else:
+        parts.append(f"\x1e{vid}=" + self.value(val).decode(self.enc).replace('%', '%%'))
+    fmt = "".join(parts)
+    (n, enc) = (len(info), self.enc)
+
+    def fill(**values):
+      s = fmt % tuple(map(values.__getitem__, slots))
+      if s.count('\x1e') != n or '\x1f' in s or '\x03' in s:
+        bad = [v for v in values.values() if any(c in str(v) for c in '\x1e\x1f\x03')]
+        raise ValueError(f"SSV value cannot hold separators: {bad[0]!r}")
+      return s.encode(enc)
+    return fill
+
+
+CONTENT_ENCODINGS = None # see content_encodings()
+
+def content_encodings():
+  # Accept-Encoding value of what can be decompressed here; brotli only
+  # when the module is installed, looked up without importing it
+  global CONTENT_ENCODINGS
+  if CONTENT_ENCODINGS is None:
+    import importlib.util
+    brotli = importlib.util.find_spec('brotli') is not None
+    CONTENT_ENCODINGS = "gzip, deflate, br" if brotli else "gzip, deflate"
+  return CONTENT_ENCODINGS
+
+class ContentDecoder:
+  # readable decompressing what is read from src, e.g. HTTPResponse, by
+  # its Content-Encoding, as it arrives: read1 decompresses one chunk
+  def __init__(self, src, encoding):
+    self.src = src
+    self.encoding = encoding
+    if encoding in ('gzip', 'x-gzip'):
+      self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+      self.decompressor = None # chosen by the first two bytes, see decompress
+      self.header = b''
+    elif encoding == 'br':
+      import brotli
+      self.decompressor = brotli.Decompressor()
+    else:
+      raise ValueError(f"unsupported content encoding '{encoding}'")
+    self.flushed = False
+
+  def decompress(self, data):
+    if self.encoding == 'br':
+      return self.decompressor.process(data)
+    if self.decompressor is None:
+      # 'deflate' is zlib format, yet some servers send raw deflate; a zlib
+      # header is CM 8 and a multiple of 31, however the body is chunked
+      self.header += data
+      if len(self.header) < 2: return b''
+      (cmf, flg) = self.header[:2]
+      wbits = zlib.MAX_WBITS if cmf & 0x0f == 8 and (cmf << 8 | flg) % 31 == 0 else -zlib.MAX_WBITS
+      self.decompressor = zlib.decompressobj(wbits)
+      (data, self.header) = (self.header, b'')
+    return self.decompressor.decompress(data)
+
+  def flush(self):
+    # what is left at the end of the body, once
+    if self.flushed or self.encoding == 'br': return b''
+    self.flushed = True
+    if self.decompressor is None: # body of less than two bytes
+      self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+      return self.decompressor.decompress(self.header) + self.decompressor.flush()
+    return self.decompressor.flush()
+
+  def read1(self, n=-1):
+    read = getattr(self.src, 'read1', self.src.read)
+    while True:
+      data = read(n)
+      if not data: return self.flush()
+      out = self.decompress(data)
+      if out: return out
+
+  def read(self, n=-1):
+    # the rest at once; reads src to its end, closing a drained HTTPResponse
+    data = self.src.read()
+    if self.flushed: return b''
+    return self.decompress(data) + self.flush()
+
+
+
+class Metrics:
+  # timings of the phases of a run and its counters; phases may nest, e.g.
+  # 'decode' and 'receive' are part of 'select', so they do not add up.
+  # streamed bodies are decoded while received; time blocked reading the
+  # socket counts as 'receive', the rest as 'decode'
+
+  COUNTERS = ['requests', 'connects', 'bytes_sent', 'bytes_received',
+    'retries', 'logins', 'relogins', 'role_changes']
+
+  def __init__(self):
+    self.started = datetime.now().timestamp()
+    self.start = perf_counter()
+    self.phases = {}
+    self.counters = dict.fromkeys(self.COUNTERS, 0)
+    self.lock = threading.Lock() # months of a range are fetched in threads
+
+  def add(self, phase, seconds):
+    with self.lock:
+      self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+  def count(self, counter, n=1):
+    with self.lock:
+      self.counters[counter] += n
+
+  def phase(self, name):
+    return MetricsPhase(self, name)
+
+  def sent(self, method, path, body, headers):
+    # approximate size on the wire, as http.client puts it
+    size = len(method) + len(path) + len(" HTTP/1.1\r\n\r\n")
+    size += sum(len(hf) + len(hv) + 4 for (hf, hv) in headers.items())
+    size += len(body.encode('utf-8') if isinstance(body, str) else body)
+    self.count('requests')
+    self.count('bytes_sent', size)
+
+  def received(self, response):
+    self.count('bytes_received', sum(len(hf) + len(hv) + 4 for (hf, hv) in response.getheaders()))
+
+  def report(self, account, command, code):
+    # one run as a dict, as in metrics_path
+    return {
+      'time': self.started, 'account': account, 'command': command, 'code': code,
+      'seconds': perf_counter() - self.start, 'phases': self.phases, **self.counters,
+    }
+
+class MetricsPhase:
+  def __init__(self, metrics, name):
+    self.metrics = metrics
+    self.name = name
+
+  def __enter__(self):
+    self.start = perf_counter()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.metrics.add(self.name, perf_counter() - self.start)
+
+class CountingReader:
+  # response wrapper counting bytes read and time blocked on reading
+  def __init__(self, src, metrics):
+    self.src = src
+    self.metrics = metrics
+    self.elapsed = 0
+    self.phase = None # Metrics phase reads are timed as, if any
+
+  def read(self, *args):
+    return self.counted(self.src.read, args)
+
+  def read1(self, *args):
+    return self.counted(getattr(self.src, 'read1', self.src.read), args)
+
+  def counted(self, read, args):
+    start = perf_counter()
+    if self.phase:
+      with self.metrics.phase(self.phase):
+        data = read(*args)
+    else:
+      data = read(*args)
+    self.elapsed += perf_counter() - start
+    self.metrics.count('bytes_received', len(data))
+    return data
+
+class TeeReader:
+  # readable passing reads of src through, keeping what was read
+  def __init__(self, src):
+    self.src = src
+    self.chunks = []
+
+  def read(self, *args):
+    return self.kept(self.src.read(*args))
+
+  def read1(self, *args):
+    return self.kept(getattr(self.src, 'read1', self.src.read)(*args))
+
+  def kept(self, data):
+    self.chunks.append(data)
+    return data
+
+  def getvalue(self):
+    return b"".join(self.chunks)
+
+def timed(phase):
+  # decorator timing a ZeusRequest method, or coroutine of AsyncZeusRequest,
+  # as the phase of self.metrics
+  def decorator(method):
+    def timed_method(self, *args, **kwargs):
+      with self.metrics.phase(phase):
+        return method(self, *args, **kwargs)
+    async def timed_coroutine(self, *args, **kwargs):
+      with self.metrics.phase(phase):
+        return await method(self, *args, **kwargs)
+    return timed_coroutine if method.__code__.co_flags & 0x80 else timed_method # CO_COROUTINE
+  return decorator
+
+
+class ServerError(ConnectionError):
+  # response of error status, e.g. 503 while the server is overloaded
+  def __init__(self, status, reason):
+    super().__init__(f"server returned {status}, {reason}")
+    self.status = status
+
+def transient(e):
+  # whether the error may go away by trying again after a while; note
+  # ConnectionRefusedError without errno is the server rejecting session
+  if isinstance(e, ServerError):
+    return e.status >= 500
+  if isinstance(e, ConnectionRefusedError):
+    return e.errno is not None
+  if isinstance(e, (TimeoutError, ConnectionResetError, ConnectionAbortedError,
+      BrokenPipeError, http.client.IncompleteRead, socket.gaierror)):
+    return True
+  return isinstance(e, OSError) and e.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH)
+
+
+class RateLimiter:
+  # shared by the requests of a batch: token bucket of up to rps requests
+  # per second and a cap on connections open at once. The rate adapts as
+  # AIMD does: halved (at most once a second, down to rps/16) on 5xx,
+  # timeouts or responses slower than slow seconds, otherwise raised by
+  # rps/20 per response back up to rps
+
+  def __init__(self, rps=None, connections=None, slow=2.0):
+    self.max_rate = rps
+    self.rate = rps
+    self.slow = slow
+    self.tokens = 1.0
+    self.updated = perf_counter()
+    self.decreased = 0
+    self.lock = threading.Lock()
+    self.slots = threading.BoundedSemaphore(connections) if connections else None
+
+  def acquire(self, timeout):
+    # waits for a token to send a request, at most timeout seconds
+    wait = self.reserve(timeout)
+    if wait > 0: sleep(wait)
+
+  def reserve(self, timeout):
+    # takes a token ahead, returns seconds to wait before sending with it
+    if self.rate is None: return 0
+    with self.lock:
+      now = perf_counter()
+      self.tokens = min(self.tokens + (now - self.updated) * self.rate, max(self.rate, 1.0))
+      self.updated = now
+      wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+      if wait > timeout:
+        raise TimeoutError("request rate limit would pass the deadline")
+      self.tokens -= 1 # taken ahead, others wait after this one
+    return wait
+
+  def done(self, seconds, error):
+    # the response of a request took seconds, error if it failed
+    if self.rate is None: return
+    with self.lock:
+      now = perf_counter()
+      if error or seconds > self.slow:
+        if now - self.decreased >= 1:
+          self.rate = max(self.rate / 2, self.max_rate / 16)
+          self.decreased = now
+      else:
+        self.rate = min(self.rate + self.max_rate / 20, self.max_rate)
+
+  def connect(self, timeout):
+    # takes a connection slot, at most waiting timeout seconds
+    if self.slots and not self.slots.acquire(timeout=timeout):
+      raise TimeoutError("no connection slot free in time")
+
+  def try_connect(self):
+    # takes a connection slot if one is free, whether it did
+    return not self.slots or self.slots.acquire(blocking=False)
+
+  def disconnect(self):
+    if self.slots: self.slots.release()
+
 
 class ZeusRequest:
 
@@ -92,8 +697,44 @@ class ZeusRequest:
   SELECT_PATH = "/amc/amcDailyTempRegE/select.do"
   SAVE_PATH   = "/amc/amcDailyTempRegE/save.do"
 
+  SELECT_WORKERS = 6 # concurrent months of request_select_range
+  TIMEOUTS = (10.0, 30.0) # seconds to connect, to wait for each read
+
   SSV_GUBUN  = "AA"
   SSV_PGKEY  = "PERS07^PERS07_08^005^AmcDailyTempRegE"
+  # variables of SSV request bodies in order; values other than None are
+  # the same in every request and encoded once, see ssv_body()
+  SSV_BODIES = {
+    'role': [
+      ('WMONID',    None),
+      ('pg_key',    ""),
+      ('pg_nm',     ""),
+      ('page_open_time', ""),
+      ('page_open_time_on', ""),
+    ],
+    'select': [
+      ('WMONID',    None),
+      ('dept_cd',   None),
+      ('chk_dt',    None),
+      ('pg_key',    SSV_PGKEY),
+      ('page_open_time', ""),
+      ('page_open_time_on', None),
+    ],
+    'save': [
+      ('WMONID',    None),
+      ('dept_cd',   None),
+      ('mbr_no',    None),
+      ('chk_dt',    None),
+      ('temp',      None),
+      *((f'sympt_{k}', None) for k in range(1, 7)),
+      ('spc_ctnt',  None),
+      ('gubun',     SSV_GUBUN),
+      ('pg_key',    SSV_PGKEY),
+      ('page_open_time', ""),
+      ('page_open_time_on', None),
+    ],
+  }
+  SSV_TEMPLATES = {} # endpoint -> NexacroSsvEncoder.template, made on first use
 
   # copy & pasted from chrome inspector
   # then :s/^\([^:]\+\):\s*\(.\+\)$/"\1": '\2',/g
@@ -112,17 +753,185 @@ class ZeusRequest:
     "Sec-Fetch-Site": 'same-origin',
     "Sec-Fetch-Mode": 'cors',
     "Sec-Fetch-Dest": 'empty',
-    "Accept-Encoding": 'gzip, deflate, br',
+    "Accept-Encoding": 'gzip, deflate, br', # narrowed to content_encodings()
     "Accept-Language": 'ko-KR,ko;q=0.9',
   }
 
-  def __init__(self, cache={}):
-    self.conn = http.client.HTTPSConnection(self.BASE_URL);
+  # endpoint -> (path, Referer, header fields over BASE_HEADERS, None
+  # to remove, whether it may be sent again)
+  SSV_FIELDS = {"Accept": "*/*", "Content-Type": "text/plain;charset=UTF-8",
+    "X-Requested-With": None}
+  ENDPOINTS = {
+    'login':  (LOGIN_PATH,  '/sys/main/login.do', {}, True),
+    'role':   (ROLE_PATH,   '/index.html', SSV_FIELDS, True),
+    'select': (SELECT_PATH, '/index.html', SSV_FIELDS, True),
+    'save':   (SAVE_PATH,   '/index.html', SSV_FIELDS, False),
+  }
+
+  def __init__(self, cache={}, url=None, store=None, metrics=None, timeouts=TIMEOUTS):
+    # url points to the server, e.g. a local stand-in 'http://localhost:8080'
+    # store, a RecordStore of the account, is kept up to date if given
+    # metrics, of the run, are collected to a Metrics
+    # timeouts are (connect, read) in seconds, both cut to deadline if set
+    url = urllib.parse.urlsplit(url or 'https://' + self.BASE_URL)
+    if url.scheme == 'https':
+      self.conn = http.client.HTTPSConnection(url.netloc)
+    elif url.scheme == 'http':
+      self.conn = http.client.HTTPConnection(url.netloc)
+    else:
+      raise ValueError(f"unsupported server url '{url.geturl()}'")
+    self.origin = f"{url.scheme}://{url.netloc}"
+    self.base_headers = dict(self.BASE_HEADERS, Host=url.netloc, Origin=self.origin)
+    self.base_headers["Accept-Encoding"] = content_encodings()
+    self.templates = {}
+    for (endpoint, (path, referer, fields, idempotent)) in self.ENDPOINTS.items():
+      headers = dict(self.base_headers, Referer=self.origin + referer, **fields)
+      self.templates[endpoint] = (path,
+        {hf: hv for (hf, hv) in headers.items() if hv is not None}, idempotent)
+    self.set_cache(cache)
+    self.last_response = None
+    self.last_data = None
+    self.store = store
+    self.metrics = metrics or Metrics()
+    self.connecting = None
+    self.fresh = False # connected but not used yet
+    self.on_request = None
+    self.timeouts = timeouts
+    self.deadline = None # perf_counter() the command must end by
+    self.unsafe = False # save may have reached the server without answer
+    self.streamed = 0 # lines of select written by the command, see execute_command
+    self.limiter = None # RateLimiter shared with other accounts, if any
+    self.slot = False # connection slot of limiter taken
+    self.role_check = None # future of role.do sent along, see speculate_role
+    self.archive = None # (ResponseArchive, account) response bodies go to, if any
+    self.last_endpoint = None
+
+  def set_cache(self, cache):
     self.cookies = cache.get('cookies', {})
+    self.cookie_header = None
     cache.pop('cookies', None)
     self.cache = cache
-    self.last_response = None
-    self.last_data = None
+
+  def preconnect(self):
+    # connects (TLS handshake included) in background, overlapping with
+    # whatever comes before the first request, e.g. reading cache
+    def connect():
+      try:
+        self.connect()
+      except OSError:
+        pass # the request connects again and reports it
+    self.connecting = threading.Thread(target=connect, daemon=True)
+    self.connecting.start()
+
+  def clone(self):
+    # request of the same session on a connection of its own, within the
+    # deadline, limiter and archive of this one, or None if the limiter
+    # has no connection slot free right now; an account does not wait
+    # for a slot while holding one, but does the work on its own connection.
+    # cookies are copied, the clone setting them apart from this one's
+    # until merge_cookies takes them back
+    if self.limiter and not self.limiter.try_connect(): return None
+    cache = dict(self.get_cache(), cookies=self.cookies.copy())
+    zrq = type(self)(cache, self.origin, metrics=self.metrics, timeouts=self.timeouts)
+    zrq.deadline = self.deadline
+    zrq.limiter = self.limiter
+    zrq.archive = self.archive
+    zrq.slot = bool(self.limiter) # taken above, given back on close
+    return zrq
+
+  def merge_cookies(self, zrq):
+    # takes cookies zrq, a clone done with, was given by the server
+    for (cf, cv) in zrq.cookies.items(): self.set_cookie(cf, cv)
+
+  def speculate_role(self):
+    # sends role.do on a clone while the command goes on with the role
+    # data of cache, which settle_role confirms later; whether it was
+    # sent, not without a free connection slot
+    zrq = self.clone()
+    if zrq is None: return False
+    future = concurrent.futures.Future()
+    def role():
+      try:
+        with zrq:
+          future.set_result((zrq.request_role(), zrq))
+      except BaseException as e:
+        future.set_exception(e)
+    self.role_check = future
+    threading.Thread(target=role, daemon=True).start()
+    return True
+
+  def settle_role(self):
+    # waits for role.do of speculate_role, if any, taking its role data
+    # and cookies; whether deptcd turned out other than the one used
+    if self.role_check is None: return False
+    (future, self.role_check) = (self.role_check, None)
+    ((deptcd, mbrno), zrq) = future.result()
+    self.merge_cookies(zrq)
+    changed = deptcd != self.cache.get('deptcd')
+    if changed or mbrno != self.cache.get('mbrno'): self.metrics.count('role_changes')
+    self.cache['deptcd'] = deptcd
+    self.cache['mbrno'] = mbrno
+    return changed
+
+  def timeout(self, seconds):
+    # seconds, or what is left to deadline if less
+    if self.deadline is None: return seconds
+    left = self.deadline - perf_counter()
+    if left <= 0: raise TimeoutError("deadline of the command exceeded")
+    return min(seconds, left)
+
+  def connect(self):
+    with self.metrics.phase('connect'):
+      if self.limiter and not self.slot:
+        self.limiter.connect(self.timeout(self.timeouts[0]))
+        self.slot = True
+      self.conn.timeout = self.timeout(self.timeouts[0])
+      self.conn.connect()
+    self.fresh = True
+    self.metrics.count('connects')
+
+  def ready(self):
+    # waits for preconnect before using the connection, or connects
+    if self.connecting is not None:
+      self.connecting.join()
+      self.connecting = None
+    if self.conn.sock is None:
+      self.connect()
+
+  def body(self, response):
+    # (readable of the response body, decompressed, CountingReader of it)
+    reader = CountingReader(response, self.metrics)
+    encoding = (response.getheader('Content-Encoding') or 'identity').strip().lower()
+    if encoding == 'identity':
+      return (reader, reader)
+    return (ContentDecoder(reader, encoding), reader)
+
+  def decode(self, src, **kwargs):
+    # nexacro_ssv_decode counting what is received; decompression is
+    # counted as 'decode'. a response is archived as it was received
+    if isinstance(src, (bytes, bytearray, memoryview)):
+      with self.metrics.phase('decode'):
+        return nexacro_ssv_decode(src, **kwargs)
+    (body, reader) = self.body(src)
+    reader.phase = 'receive' # within 'decode', taken out of it below
+    tee = None
+    if self.archive: body = tee = TeeReader(body)
+    try:
+      with self.metrics.phase('decode'):
+        try:
+          return nexacro_ssv_decode(body, **kwargs)
+        except ValueError:
+          if tee: tee.read() # the rest of what failed to parse
+          raise
+    finally:
+      self.metrics.add('decode', -reader.elapsed)
+      if tee: self.archived(src.status, tee.getvalue())
+
+  def archived(self, status, body):
+    # appends body of the last response to the archive, if any
+    if self.archive:
+      (archive, account) = self.archive
+      archive.append(account, self.last_endpoint, status, body)
 
   def get_cache(self):
     cache = self.cache.copy()
@@ -132,90 +941,141 @@ class ZeusRequest:
   def __enter__(self):
     return self
 
-  def __exit__(self, exc_type, exc_value, traceback):
+  def close(self):
+    # closes connection, giving its slot back
     self.conn.close()
+    if self.slot:
+      self.slot = False
+      self.limiter.disconnect()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+    if self.store: self.store.close()
 
 
   def cookie_monster(self, headers):
     for cookie in (hv for (hf,hv) in headers if hf == "Set-Cookie"):
       cookie_content = cookie.split(';')[0]
       (cf,cv) = cookie_content.split('=', 1)
-      self.cookies[cf.strip()] = cv.strip()
+      self.set_cookie(cf.strip(), cv.strip())
+
+  def set_cookie(self, cf, cv):
+    # keeps Cookie header along, appending new cookies to it
+    old = self.cookies.get(cf)
+    if old == cv: return
+    self.cookies[cf] = cv
+    if old is None and self.cookie_header is not None:
+      self.cookie_header += f"; {cf}={cv}" if self.cookie_header else f"{cf}={cv}"
+    else:
+      self.cookie_header = None # value changed, rebuilt on next request
 
   def cookie_demon(self):
-    return "; ".join(f"{cf}={cv}" for (cf,cv) in self.cookies.items())
-
-
-  def request_login(self, user_id, user_pw):
-    params = urlencode({
-      'login_id': user_id, 'login_pw': user_pw
-    }, safe='!*()')
-    headers = self.BASE_HEADERS.copy()
+    if self.cookie_header is None:
+      self.cookie_header = "; ".join(f"{cf}={cv}" for (cf,cv) in self.cookies.items())
+    return self.cookie_header
+
+
+  def before_request(self):
+    # runs the hook set to on_request once, before the first request that
+    # needs a session, e.g. to log in only when the server is asked at all
+    if self.on_request is not None:
+      (hook, self.on_request) = (self.on_request, None)
+      try:
+        hook()
+      except BaseException:
+        self.on_request = hook # e.g. login timed out, retried later
+        raise
+
+  def idle_closed(self):
+    # the server closing an idle keep-alive connection makes it readable
+    if self.conn.sock is None or self.fresh: return False
+    return bool(select.select([self.conn.sock], [], [], 0)[0])
+
+  def request(self, endpoint, params):
+    # sends params to the endpoint over the kept-alive connection and
+    # returns the response, its cookies taken and status checked.
+    # reconnects when the server has closed the connection while idle;
+    # requests but save are sent again if it is found closed on sending
+    (path, template, idempotent) = self.templates[endpoint]
+    headers = template.copy()
     headers["Cookie"] = self.cookie_demon()
-    headers["Referer"] = 'https://' + self.BASE_URL + '/sys/main/login.do'
 
-    self.conn.request("POST", self.LOGIN_PATH, params, headers)
-    response = self.conn.getresponse()
-    head = response.getheaders()
-    self.cookie_monster(head)
-    data = response.read()
+    self.ready()
+    if self.idle_closed():
+      self.close()
+      self.connect()
+    for retry in (idempotent and not self.fresh, False):
+      read_timeout = self.timeout(self.timeouts[1])
+      if self.limiter: self.limiter.acquire(read_timeout)
+      try:
+        self.conn.sock.settimeout(read_timeout)
+        self.metrics.sent("POST", path, params, headers)
+        if not idempotent: self.unsafe = True
+        start = perf_counter()
+        self.conn.request("POST", path, params, headers)
+        with self.metrics.phase('wait'):
+          response = self.conn.getresponse()
+        break
+      except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+        self.close()
+        if not retry: raise
+        self.metrics.count('retries')
+        self.connect()
+      except TimeoutError:
+        if self.limiter: self.limiter.done(perf_counter() - start, True)
+        raise
+    if self.limiter: self.limiter.done(perf_counter() - start, response.status >= 500)
+    self.fresh = False
+    if response.status == 503: self.unsafe = False # refused, nothing done
+    self.metrics.received(response)
+    self.cookie_monster(response.getheaders())
     self.last_response = response
-    self.last_data = data
+    self.last_endpoint = endpoint
+    self.last_data = None # body is decoded while being received
 
     if response.status != 200:
-      raise ConnectionError(
-        f"server returned {response.status}, {response.reason}")
+      self.last_data = self.body(response)[0].read()
+      self.archived(response.status, self.last_data)
+      raise ServerError(response.status, response.reason)
+    return response
+
+  def check_ssv(self, ret):
+    # raises error reported in decoded SSV response
+    if b'ErrorMsg' in ret:
+      if ret.get(b'ErrorCode', "") == b'4000':
+        self.unsafe = False # refused before anything was done
+        raise ConnectionRefusedError # re-login needed
+      raise ConnectionError(ret[b'ErrorMsg'])
+
+
+  # requests are built and responses interpreted apart from sending them,
+  # shared with AsyncZeusRequest
 
+  def login_params(self, user_id, user_pw):
+    return urllib.parse.urlencode({
+      'login_id': user_id, 'login_pw': user_pw
+    }, safe='!*()').encode('ascii')
+
+  def login_result(self, data, head):
     try:
-      dat = json.loads(unquote(data.decode("utf-8")))
+      dat = json.loads(urllib.parse.unquote(data.decode("utf-8")))
       assert(not dat.get('error_msg', ''))
     except AssertionError:
       raise ConnectionError(dat['error_msg'])
-    except e:
+    except ValueError: # malformed JSON or UTF-8
       raise ValueError(f"error while parsing data '{data}'")
 
     if 'WMONID' not in self.cookies or 'ZSESSIONID' not in self.cookies:
       raise ConnectionError(f"login successfully failed. '{head}'")
 
-
-  def request_role(self):
+  def role_params(self):
     if 'WMONID' not in self.cookies:
       raise ConnectionRefusedError # need log-in
 
-    info = [
-      ('WMONID',    self.cookies['WMONID']),
-      ('pg_key',    ""),
-      ('pg_nm',     ""),
-      ('page_open_time', ""),
-      ('page_open_time_on', ""),
-    ]
-
-    params = nexacro_ssv_encode(info)
-    headers = self.BASE_HEADERS.copy()
-    headers["Referer"] = 'https://' + self.BASE_URL + '/index.html'
-    headers["Accept"] = "*/*"
-    headers["Content-Type"] = "text/plain;charset=UTF-8"
-    headers["Cookie"] = self.cookie_demon()
-    headers.pop("X-Requested-With", None)
-
-    self.conn.request("POST", self.ROLE_PATH, params, headers)
-    response = self.conn.getresponse()
-    head = response.getheaders()
-    self.cookie_monster(head)
-    data = response.read()
-    self.last_response = response
-    self.last_data = data
+    return self.ssv_body('role', WMONID=self.cookies['WMONID'])
 
-    if response.status != 200:
-      raise ConnectionError(
-        f"server returned {response.status}, {response.reason}")
-
-    ret = nexacro_ssv_decode(data)
-
-    if b'ErrorMsg' in ret:
-      if ret.get(b'ErrorCode', "") == b'4000':
-        raise ConnectionRefusedError # re-login needed
-      raise ConnectionError(ret[b'ErrorMsg'])
+  def role_result(self, ret):
+    self.check_ssv(ret)
 
     if b'dsUserRole' not in ret:
       raise ValueError(f"expecting 'dsUserRole' got '{ret}'")
@@ -230,123 +1090,769 @@ class ZeusRequest:
 
     return (recs[0][dcd].decode('utf-8'), recs[0][mbr].decode('utf-8'))
 
-
-  def request_select(self):
+  def select_params(self, month):
+    # month is 'YYYYMM'
     if 'WMONID' not in self.cookies:
       raise ConnectionRefusedError # need log-in
     if 'deptcd' not in self.cache:
       raise ConnectionRefusedError
 
-    info = [
-      ('WMONID',    self.cookies['WMONID']),
-      ('dept_cd',   self.cache['deptcd']),
-      ('chk_dt',    datetime.now(self.TIME_ZONE).strftime('%Y%m')),
-      ('pg_key',    self.SSV_PGKEY),
-      ('page_open_time', ""),
-      ('page_open_time_on', datetime.now(self.TIME_ZONE).strftime('%Y%m%d%H%M%S%f')),
-    ]
-
-    params = nexacro_ssv_encode(info)
-    headers = self.BASE_HEADERS.copy()
-    headers["Referer"] = 'https://' + self.BASE_URL + '/index.html'
-    headers["Accept"] = "*/*"
-    headers["Content-Type"] = "text/plain;charset=UTF-8"
-    headers["Cookie"] = self.cookie_demon()
-    headers.pop("X-Requested-With", None)
+    return self.ssv_body('select',
+      WMONID=self.cookies['WMONID'],
+      dept_cd=self.cache['deptcd'],
+      chk_dt=month,
+      page_open_time_on=datetime.now(self.TIME_ZONE).strftime('%Y%m%d%H%M%S%f'),
+    )
 
-    self.conn.request("POST", self.SELECT_PATH, params, headers)
-    response = self.conn.getresponse()
-    head = response.getheaders()
-    self.cookie_monster(head)
-    data = response.read()
-    self.last_response = response
-    self.last_data = data
-
-    if response.status != 200:
-      raise ConnectionError(
-        f"server returned {response.status}, {response.reason}")
-
-    ret = nexacro_ssv_decode(data)
-
-    if b'ErrorMsg' in ret:
-      if ret.get(b'ErrorCode', "") == b'4000':
-        raise ConnectionRefusedError # re-login needed
-      raise ConnectionError(ret[b'ErrorMsg'])
+  def select_records(self, ret):
+    # ret is select.do response decoded with dsMain columns selected
+    self.check_ssv(ret)
 
     if b'dsMain' not in ret:
       raise ValueError(f"expecting 'dsMain' got '{ret}'")
 
-    dept = 0; name = 1; stdno = 2; date = 3;
-    time = 4; temp = 5; sympt = 6;
-    spc_ctnt = 12; gubun = 13 #? = 14
-    recs = list(map(lambda row: {
-      'timestamp': datetime.strptime(row[date]+row[time], '%Y%m%d%H:%M').replace(tzinfo=self.TIME_ZONE),
-      'temperature': float(row[temp]),
-      'symptoms': "".join("O" if x else "_" for x in row[sympt:sympt+6]),
-      'significance': row[spc_ctnt]
-      }, map(lambda row: [v.decode("utf-8") for v in row], ret[b'dsMain'][0])))
-    return recs
-
+    cols = ret[b'dsMain'][0]
+    return [ZeusRecord(cols, i) for i in range(len(cols[ZeusRecord.DATE]))]
 
-  def request_save(self, symp={'temp':36.5}):
+  def save_params(self, symp):
     if 'WMONID' not in self.cookies:
       raise ConnectionRefusedError # need log-in
     if 'deptcd' not in self.cache or 'mbrno' not in self.cache:
       raise ConnectionRefusedError
 
-    info = [
-      ('WMONID',    self.cookies['WMONID']),
-      ('dept_cd',   self.cache['deptcd']),
-      ('mbr_no',    self.cache['mbrno']),
-      ('chk_dt',    datetime.now(self.TIME_ZONE).strftime('%Y-%m-%d')),
-      ('temp',      f"{symp['temp']:.1f}"), # TODO catch error
-      ('sympt_1',   'Y' if symp.get('cough', False) else 'N'),
-      ('sympt_2',   'Y' if symp.get('soret', False) else 'N'),
-      ('sympt_3',   'Y' if symp.get('dyspn', False) else 'N'),
-      ('sympt_4',   'Y' if symp.get('fever', False) else 'N'),
-      ('sympt_5',   'Y' if symp.get('losat', False) else 'N'),
-      ('sympt_6',   'Y' if symp.get('orsym', False) else 'N'),
-      ('spc_ctnt',  symp.get('special', "")),
-      ('gubun',     self.SSV_GUBUN),
-      ('pg_key',    self.SSV_PGKEY),
-      ('page_open_time', ""),
-      ('page_open_time_on', datetime.now(self.TIME_ZONE).strftime('%Y%m%d%H%M%S%f')),
-    ]
+    return self.ssv_body('save',
+      WMONID=self.cookies['WMONID'],
+      dept_cd=self.cache['deptcd'],
+      mbr_no=self.cache['mbrno'],
+      chk_dt=datetime.now(self.TIME_ZONE).strftime('%Y-%m-%d'),
+      temp=f"{symp['temp']:.1f}", # TODO catch error
+      sympt_1='Y' if symp.get('cough', False) else 'N',
+      sympt_2='Y' if symp.get('soret', False) else 'N',
+      sympt_3='Y' if symp.get('dyspn', False) else 'N',
+      sympt_4='Y' if symp.get('fever', False) else 'N',
+      sympt_5='Y' if symp.get('losat', False) else 'N',
+      sympt_6='Y' if symp.get('orsym', False) else 'N',
+      spc_ctnt=symp.get('special', ""),
+      page_open_time_on=datetime.now(self.TIME_ZONE).strftime('%Y%m%d%H%M%S%f'),
+    )
+
+  def save_notice(self, ret):
+    # ErrorCode of a save.do response accepted with a note, such as of an
+    # existing record, None for a plain 0
+    code = ret.get(b'ErrorCode') or b'0'
+    return None if code == b'0' else code.decode('utf-8', 'replace')
+
+  def ssv_body(self, endpoint, **values):
+    # SSV body of the endpoint with values of its SSV_BODIES variables
+    fill = self.SSV_TEMPLATES.get(endpoint)
+    if fill is None:
+      fill = self.SSV_TEMPLATES[endpoint] = NexacroSsvEncoder().template(self.SSV_BODIES[endpoint])
+    return fill(**values)
+
+  def save_result(self, symp, ret):
+    self.check_ssv(ret)
+
+    if self.store: self.store.saved({
+      'timestamp': datetime.now(self.TIME_ZONE),
+      'temperature': float(symp['temp']),
+      'symptoms': "".join("O" if symp.get(k, False) else "_"
+        for k in ['cough', 'soret', 'dyspn', 'fever', 'losat', 'orsym']),
+      'significance': symp.get('special', ""),
+    })
+    return ret
 
-    params = nexacro_ssv_encode(info)
-    headers = self.BASE_HEADERS.copy()
-    headers["Referer"] = 'https://' + self.BASE_URL + '/index.html'
-    headers["Accept"] = "*/*"
-    headers["Content-Type"] = "text/plain;charset=UTF-8"
-    headers["Cookie"] = self.cookie_demon()
-    headers.pop("X-Requested-With", None)
 
-    self.conn.request("POST", self.SAVE_PATH, params, headers)
-    response = self.conn.getresponse()
-    head = response.getheaders()
+  @timed('login')
+  def request_login(self, user_id, user_pw):
+    response = self.request('login', self.login_params(user_id, user_pw))
+    data = self.body(response)[0].read()
+    self.last_data = data
+    self.archived(response.status, data)
+    self.login_result(data, response.getheaders())
+
+  @timed('role')
+  def request_role(self):
+    return self.role_result(self.decode(self.request('role', self.role_params())))
+
+  @timed('select')
+  def request_select(self, month=None):
+    # month is 'YYYYMM', this month if None
+    self.before_request()
+    month = month or datetime.now(self.TIME_ZONE).strftime('%Y%m')
+    recs = self.decode_select(self.request('select', self.select_params(month)))
+    if self.settle_role(): # of another department than speculated
+      return self.request_select(month)
+    if self.store: self.store.fetched(month, recs)
+    return recs
+
+  def request_select_range(self, months, workers=SELECT_WORKERS):
+    # records of the months ('YYYYMM') in timestamp order
+    return [rec for (month, recs) in self.select_stream(months, workers) for rec in recs]
+
+  def select_stream(self, months, workers=SELECT_WORKERS):
+    # yields (month, records in timestamp order) of the months ('YYYYMM')
+    # in order; months closed when last fetched are read from the store,
+    # others fetched concurrently, each but the first on a connection of
+    # its own, at most workers months ahead of the one yielded
+    todo = [month for month in months if not (self.store and self.store.closed(month))]
+
+    def fetch(zrq, month):
+      with zrq:
+        return (zrq.cache['deptcd'], zrq.request_select(month))
+
+    ahead = {} # month -> (clone, future)
+    queue = todo[1:]
+    pool = None
+    if queue:
+      self.before_request() # clones take the session
+      pool = concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(queue)))
+    try:
+      for month in months:
+        while queue and len(ahead) < workers:
+          zrq = self.clone()
+          if zrq is None: break # no connection slot free, fetched here in turn
+          ahead[queue[0]] = (zrq, pool.submit(fetch, zrq, queue[0]))
+          queue.pop(0)
+        if month in ahead:
+          (zrq, future) = ahead.pop(month)
+          (deptcd, recs) = future.result()
+          self.merge_cookies(zrq)
+          self.settle_role()
+          if deptcd != self.cache['deptcd']: # fetched before role.do told otherwise
+            recs = self.request_select(month)
+          elif self.store: self.store.fetched(month, recs)
+        elif month in todo:
+          if month in queue: queue.remove(month)
+          recs = self.request_select(month)
+        else:
+          recs = self.store.closed_month(month)
+          if recs is None: recs = self.request_select(month) # store broke since
+        yield (month, sorted(recs, key=lambda rec: rec['timestamp']))
+    finally:
+      # not fetching further once the consumer stops
+      for (_, future) in ahead.values(): future.cancel()
+      if pool: pool.shutdown()
+
+  def decode_select(self, src):
+    # src is select.do response body, either bytes or readable
+    return self.select_records(self.decode(src, columns={b'dsMain': ZeusRecord.COLUMNS}, raw=True))
+
+  @timed('save')
+  def request_save(self, symp={'temp':36.5}):
+    self.before_request()
+    self.settle_role() # not saved on speculation, it cannot be undone
+    ret = self.decode(self.request('save', self.save_params(symp)))
+    return self.save_result(symp, ret)
+
+class AsyncResponse:
+  # status and headers of a response read by AsyncZeusRequest, whose body
+  # is read with chunks() before the next request on the connection
+  def __init__(self, zrq, status, reason, headers):
+    self.zrq = zrq
+    self.status = status
+    self.reason = reason
+    self.headers = headers
+    self.elapsed = 0 # seconds waited for the body
+
+  def getheader(self, name, default=None):
+    name = name.lower()
+    return next((hv for (hf, hv) in self.headers if hf.lower() == name), default)
+
+  def getheaders(self):
+    return self.headers
+
+  async def chunks(self):
+    # raw body chunks, by Content-Length, chunked or up to close
+    zrq = self.zrq
+    reader = zrq.streams[0]
+    length = self.getheader('Content-Length')
+    if 'chunked' in self.getheader('Transfer-Encoding', '').lower():
+      while True:
+        size = int((await self.read(reader.readline())).split(b';')[0], 16)
+        if size == 0:
+          while (await self.read(reader.readline())) not in (b'\r\n', b'\n', b''): pass
+          break
+        yield (await self.read(reader.readexactly(size + 2)))[:-2]
+    elif length is not None:
+      left = int(length)
+      while left > 0:
+        chunk = await self.read(reader.read(min(left, SSV_CHUNK_SIZE)))
+        if not chunk: raise http.client.IncompleteRead(b'', left)
+        left -= len(chunk)
+        yield chunk
+    else:
+      while chunk := await self.read(reader.read(SSV_CHUNK_SIZE)):
+        yield chunk
+      zrq.close()
+    if 'close' in self.getheader('Connection', '').lower():
+      zrq.close()
+
+  async def read(self, aw):
+    start = perf_counter()
+    try:
+      data = await self.zrq.wait(aw, self.zrq.timeouts[1])
+    except asyncio.IncompleteReadError as e:
+      raise http.client.IncompleteRead(e.partial, e.expected)
+    self.elapsed += perf_counter() - start
+    self.zrq.metrics.count('bytes_received', len(data))
+    return data
+
+
+class AsyncZeusRequest(ZeusRequest):
+  # ZeusRequest over asyncio streams, its request_* coroutines raising the
+  # same errors, so that one event loop drives many accounts at once.
+  # keeps one connection alive as ZeusRequest; http.client is not used
+
+  SSL_CONTEXT = None # shared, loading CA certificates once
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.streams = None # (reader, writer) while connected
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    self.close()
+    if self.store: self.store.close()
+
+  async def wait(self, aw, seconds):
+    # awaits aw for at most seconds, cut to deadline
+    try:
+      return await asyncio.wait_for(aw, self.timeout(seconds))
+    except asyncio.TimeoutError: # not TimeoutError before python 3.11
+      raise TimeoutError("timed out")
+
+  async def connect(self):
+    url = urllib.parse.urlsplit(self.origin)
+    context = None
+    if url.scheme == 'https':
+      if AsyncZeusRequest.SSL_CONTEXT is None:
+        import ssl
+        AsyncZeusRequest.SSL_CONTEXT = ssl.create_default_context()
+      context = AsyncZeusRequest.SSL_CONTEXT
+    with self.metrics.phase('connect'):
+      if self.limiter and not self.slot:
+        await self.wait(self.take_slot(), self.timeouts[0])
+        self.slot = True
+      self.streams = await self.wait(asyncio.open_connection(url.hostname,
+        url.port or (443 if context else 80), ssl=context), self.timeouts[0])
+    self.fresh = True
+    self.metrics.count('connects')
+
+  async def take_slot(self):
+    # slots of the limiter are shared with threads; polled, not to block
+    # the event loop
+    while not self.limiter.try_connect(): await asyncio.sleep(0.01)
+
+  def close(self):
+    if self.streams is not None:
+      self.streams[1].close()
+      self.streams = None
+    if self.slot:
+      self.slot = False
+      self.limiter.disconnect()
+
+  def idle_closed(self):
+    return self.streams is not None and not self.fresh and self.streams[0].at_eof()
+
+  async def before_request(self):
+    if self.on_request is not None:
+      (hook, self.on_request) = (self.on_request, None)
+      try:
+        await hook()
+      except BaseException:
+        self.on_request = hook
+        raise
+
+  async def request(self, endpoint, params):
+    # as ZeusRequest.request, returning AsyncResponse
+    (path, template, idempotent) = self.templates[endpoint]
+    headers = dict(template, Cookie=self.cookie_demon())
+    headers["Content-Length"] = str(len(params))
+    data = "".join([f"POST {path} HTTP/1.1\r\n",
+      *(f"{hf}: {hv}\r\n" for (hf, hv) in headers.items()), "\r\n"]).encode('latin-1') + params
+
+    if self.idle_closed(): self.close()
+    if self.streams is None: await self.connect()
+    for retry in (idempotent and not self.fresh, False):
+      if self.limiter: await asyncio.sleep(self.limiter.reserve(self.timeout(self.timeouts[1])))
+      (reader, writer) = self.streams
+      self.metrics.count('requests')
+      self.metrics.count('bytes_sent', len(data))
+      if not idempotent: self.unsafe = True
+      start = perf_counter()
+      try:
+        writer.write(data)
+        await self.wait(writer.drain(), self.timeouts[1])
+        with self.metrics.phase('wait'):
+          line = await self.wait(reader.readline(), self.timeouts[1])
+        if not line:
+          raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        break
+      except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+        self.close()
+        if not retry: raise
+        self.metrics.count('retries')
+        await self.connect()
+      except TimeoutError:
+        if self.limiter: self.limiter.done(perf_counter() - start, True)
+        raise
+
+    (_, status, *reason) = line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+    head = []
+    while (line := await self.wait(reader.readline(), self.timeouts[1])) not in (b'\r\n', b'\n', b''):
+      (hf, hv) = line.decode('latin-1').split(':', 1)
+      head.append((hf.strip(), hv.strip()))
+    self.metrics.count('bytes_received', sum(len(hf) + len(hv) + 4 for (hf, hv) in head))
+    response = AsyncResponse(self, int(status), "".join(reason), head)
+    if self.limiter: self.limiter.done(perf_counter() - start, response.status >= 500)
+    self.fresh = False
+    if response.status == 503: self.unsafe = False
     self.cookie_monster(head)
-    data = response.read()
+    self.last_response = response
+    self.last_endpoint = endpoint
+    self.last_data = None
 
     if response.status != 200:
-      raise ConnectionError(
-        f"server returned {response.status}, {response.reason}")
+      self.last_data = await self.read_body(response)
+      self.archived(response.status, self.last_data)
+      raise ServerError(response.status, response.reason)
+    return response
+
+  async def body_chunks(self, response):
+    # decompressed body chunks
+    encoding = (response.getheader('Content-Encoding') or 'identity').strip().lower()
+    decoder = None if encoding == 'identity' else ContentDecoder(None, encoding)
+    async for chunk in response.chunks():
+      if decoder: chunk = decoder.decompress(chunk)
+      if chunk: yield chunk
+    if decoder and (tail := decoder.flush()): yield tail
+
+  async def read_body(self, response):
+    return b"".join([chunk async for chunk in self.body_chunks(response)])
+
+  async def decode(self, response, columns=None, raw=False):
+    # as ZeusRequest.decode, feeding chunks to the decoder as they arrive
+    decoder = NexacroSsvDecoder(columns, raw)
+    ret = {}
+    kept = [] if self.archive else None
+    chunks = self.body_chunks(response)
+    start = perf_counter()
+    try:
+      async for chunk in chunks:
+        if kept is not None: kept.append(chunk)
+        nexacro_ssv_collect(decoder.feed(chunk), ret)
+      nexacro_ssv_collect(decoder.close(), ret)
+    except ValueError:
+      if kept is not None: kept += [chunk async for chunk in chunks] # the rest of what failed to parse
+      raise
+    finally:
+      if kept is not None: self.archived(response.status, b"".join(kept))
+    self.metrics.add('receive', response.elapsed)
+    self.metrics.add('decode', perf_counter() - start - response.elapsed)
+    return ret
 
-    ret = nexacro_ssv_decode(data)
 
-    if b'ErrorMsg' in ret:
-      if ret.get(b'ErrorCode', "") == b'4000':
-        raise ConnectionRefusedError # re-login needed
-      raise ConnectionError(ret[b'ErrorMsg'])
+  @timed('login')
+  async def request_login(self, user_id, user_pw):
+    response = await self.request('login', self.login_params(user_id, user_pw))
+    data = await self.read_body(response)
+    self.last_data = data
+    self.archived(response.status, data)
+    self.login_result(data, response.getheaders())
+
+  @timed('role')
+  async def request_role(self):
+    return self.role_result(await self.decode(await self.request('role', self.role_params())))
+
+  @timed('select')
+  async def request_select(self, month=None):
+    await self.before_request()
+    month = month or datetime.now(self.TIME_ZONE).strftime('%Y%m')
+    response = await self.request('select', self.select_params(month))
+    recs = self.select_records(await self.decode(response,
+      columns={b'dsMain': ZeusRecord.COLUMNS}, raw=True))
+    if self.store: self.store.fetched(month, recs)
+    return recs
 
-    return ret
+  async def request_select_range(self, months, workers=ZeusRequest.SELECT_WORKERS):
+    return [rec async for (month, recs) in self.select_stream(months, workers) for rec in recs]
 
-def show_record(rec):
+  async def select_stream(self, months, workers=ZeusRequest.SELECT_WORKERS):
+    # async generator of ZeusRequest.select_stream, clones run as tasks
+    todo = [month for month in months if not (self.store and self.store.closed(month))]
+
+    async def fetch(zrq, month):
+      async with zrq:
+        return await zrq.request_select(month)
+
+    ahead = {} # month -> (clone, task)
+    queue = todo[1:]
+    if queue: await self.before_request() # clones take the session
+    try:
+      for month in months:
+        while queue and len(ahead) < workers:
+          zrq = self.clone()
+          if zrq is None: break # no connection slot free, fetched here in turn
+          ahead[queue[0]] = (zrq, asyncio.ensure_future(fetch(zrq, queue[0])))
+          queue.pop(0)
+        if month in ahead:
+          (zrq, task) = ahead.pop(month)
+          recs = await task
+          self.merge_cookies(zrq)
+          if self.store: self.store.fetched(month, recs)
+        elif month in todo:
+          if month in queue: queue.remove(month)
+          recs = await self.request_select(month)
+        else:
+          recs = self.store.closed_month(month)
+          if recs is None: recs = await self.request_select(month) # store broke since
+        yield (month, sorted(recs, key=lambda rec: rec['timestamp']))
+    finally:
+      for (_, task) in ahead.values(): task.cancel()
+
+  @timed('save')
+  async def request_save(self, symp={'temp':36.5}):
+    await self.before_request()
+    ret = await self.decode(await self.request('save', self.save_params(symp)))
+    return self.save_result(symp, ret)
+
+# dsMain column infos of select.do responses, in ZeusRecord column order
+ZEUS_SELECT_COLUMNS = ["DEPT_CD:STRING(8)", "NM:STRING(32)", "STDNO:STRING(8)",
+  "CHK_DT:STRING(8)", "CHK_TM:STRING(5)", "TEMP:STRING(4)",
+  *(f"SYMPT_{k}:STRING(1)" for k in range(1, 7)),
+  "SPC_CTNT:STRING(256)", "GUBUN:STRING(2)", "ETC:STRING(8)"]
+
+ZEUS_DAYS = {} # b'YYYYMMDD' -> midnight of the day in ZeusRequest.TIME_ZONE
+
+def zeus_timestamp(date, time):
+  # b'YYYYMMDD', b'HH:MM' -> datetime; parses each day once, not strptime a row
+  day = ZEUS_DAYS.get(date)
+  if day is None:
+    day = datetime.strptime(date.decode('ascii'), '%Y%m%d').replace(tzinfo=ZeusRequest.TIME_ZONE)
+    ZEUS_DAYS[date] = day
+  if len(time) != 5 or time[2] != 0x3a or not (time[:2] + time[3:]).isdigit():
+    raise ValueError(f"malformed time '{time}'")
+  return day.replace(hour=int(time[0:2]), minute=int(time[3:5]))
+
+class ZeusRecord:
+  # a record of select.do, backed by the raw dsMain columns it was decoded
+  # from; each field is decoded on its first access. readable as the
+  # record dicts, rec['timestamp'] etc., as well as rec.timestamp
+
+  # dsMain columns
+  DEPT = 0; NAME = 1; STDNO = 2; DATE = 3
+  TIME = 4; TEMP = 5; SYMPT = 6
+  SPC_CTNT = 12; GUBUN = 13 #? = 14
+  SYMPTOMS = list(range(SYMPT, SYMPT+6))
+  COLUMNS = [DATE, TIME, TEMP, *SYMPTOMS, SPC_CTNT]
+
+  __slots__ = ('cols', 'i', '_timestamp', '_temperature', '_symptoms', '_significance')
+
+  def __init__(self, cols, i):
+    self.cols = cols
+    self.i = i
+
+  @classmethod
+  def of(cls, timestamp, temperature, symptoms, significance):
+    rec = cls(None, None)
+    rec._timestamp = timestamp
+    rec._temperature = temperature
+    rec._symptoms = symptoms
+    rec._significance = significance
+    return rec
+
+  @property
+  def timestamp(self):
+    try:
+      return self._timestamp
+    except AttributeError:
+      self._timestamp = zeus_timestamp(self.cols[self.DATE][self.i], self.cols[self.TIME][self.i])
+      return self._timestamp
+
+  @property
+  def temperature(self):
+    try:
+      return self._temperature
+    except AttributeError:
+      self._temperature = float(self.cols[self.TEMP][self.i])
+      return self._temperature
+
+  @property
+  def symptoms(self):
+    try:
+      return self._symptoms
+    except AttributeError:
+      self._symptoms = "".join("O" if self.cols[k][self.i] else "_" for k in self.SYMPTOMS)
+      return self._symptoms
+
+  @property
+  def significance(self):
+    try:
+      return self._significance
+    except AttributeError:
+      sc = self.cols[self.SPC_CTNT][self.i]
+      self._significance = sc.decode('utf-8') if sc else ""
+      return self._significance
+
+  def __getitem__(self, field):
+    if field not in ('timestamp', 'temperature', 'symptoms', 'significance'):
+      raise KeyError(field)
+    return getattr(self, field)
+
+def records_newest_first(recs):
+  # records are listed in either time order; scanning from the newest end
+  # lets checks for recent records stop at the first hit
+  if len(recs) > 1 and recs[0]['timestamp'] < recs[-1]['timestamp']:
+    return reversed(recs)
+  return recs
+
+class RecordStore:
+  # sqlite store of records of an account, as fetched from and saved to
+  # the server, so that 'check' need not ask the server every time.
+  # fetching a month replaces what is stored for the month.
+  # store errors are reported once and the store is not used any more.
+
+  SCHEMA = """
+    CREATE TABLE IF NOT EXISTS records (
+      username      TEXT NOT NULL,
+      timestamp     REAL NOT NULL,
+      temperature   REAL NOT NULL,
+      symptoms      TEXT NOT NULL,
+      significance  TEXT NOT NULL,
+      source        TEXT NOT NULL -- 'fetched' or 'saved'
+    );
+    CREATE INDEX IF NOT EXISTS records_by_time ON records (username, timestamp);
+    CREATE TABLE IF NOT EXISTS months (
+      username      TEXT NOT NULL,
+      month         TEXT NOT NULL, -- 'YYYYMM'
+      fetched       REAL NOT NULL, -- a month fetched after its end is closed
+      PRIMARY KEY (username, month)
+    );
+  """
+
+  def __init__(self, path, username):
+    self.path = path
+    self.username = username
+    self.db = None
+    self.broken = False
+
+  def execute(self, fn):
+    if self.broken: return None
+    try:
+      if self.db is None:
+        # daemon uses an account from several threads, one at a time
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+      with self.db: # one transaction
+        return fn(self.db)
+    except sqlite3.Error as e:
+      print(f"Error while using record store '{self.path}': {e}", file=sys.stderr)
+      self.broken = True
+      return None
+
+  def close(self):
+    if self.db is not None: self.db.close()
+    self.db = None
+
+  def insert(self, db, recs, source):
+    db.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)", [
+      (self.username, rec['timestamp'].timestamp(), rec['temperature'],
+        rec['symptoms'], rec['significance'], source) for rec in recs])
+
+  def month_range(self, month):
+    # month is 'YYYYMM' in ZeusRequest.TIME_ZONE
+    first = datetime.strptime(month, '%Y%m').replace(tzinfo=ZeusRequest.TIME_ZONE)
+    last = (first + timedelta(days=32)).replace(day=1)
+    return (first.timestamp(), last.timestamp())
+
+  def fetched(self, month, recs):
+    (first, last) = self.month_range(month)
+    def fn(db):
+      db.execute("DELETE FROM records WHERE username = ? AND ? <= timestamp AND timestamp < ?",
+        (self.username, first, last))
+      self.insert(db, recs, 'fetched')
+      db.execute("INSERT OR REPLACE INTO months VALUES (?, ?, ?)",
+        (self.username, month, datetime.now().timestamp()))
+    self.execute(fn)
+
+  def closed(self, month):
+    # whether the month was over when last fetched; nothing can be saved
+    # to a past month so its records never change
+    (first, last) = self.month_range(month)
+    row = self.execute(lambda db: db.execute(
+      "SELECT fetched FROM months WHERE username = ? AND month = ?",
+      (self.username, month)).fetchone())
+    return row is not None and row[0] >= last
+
+  def closed_month(self, month):
+    # records of the month if it was over when last fetched, None otherwise
+    (first, last) = self.month_range(month)
+    def fn(db):
+      row = db.execute("SELECT fetched FROM months WHERE username = ? AND month = ?",
+        (self.username, month)).fetchone()
+      if row is None or row[0] < last: return None
+      return db.execute("SELECT timestamp, temperature, symptoms, significance FROM records"
+        " WHERE username = ? AND ? <= timestamp AND timestamp < ? ORDER BY timestamp",
+        (self.username, first, last)).fetchall()
+    rows = self.execute(fn)
+    if rows is None: return None
+    return [ZeusRecord.of(datetime.fromtimestamp(ts, ZeusRequest.TIME_ZONE), temp, sympt, sig)
+      for (ts, temp, sympt, sig) in rows]
+
+  def saved(self, rec):
+    self.execute(lambda db: self.insert(db, [rec], 'saved'))
+
+  def fetched_month(self, month):
+    # whether records of the month are known, having fetched it
+    row = self.execute(lambda db: db.execute(
+      "SELECT 1 FROM months WHERE username = ? AND month = ?",
+      (self.username, month)).fetchone())
+    return row is not None
+
+  def recorded_since(self, checkpoint):
+    row = self.execute(lambda db: db.execute(
+      "SELECT 1 FROM records WHERE username = ? AND timestamp >= ? LIMIT 1",
+      (self.username, checkpoint.timestamp())).fetchone())
+    return row is not None
+
+class ResponseArchive:
+  # append-only file of response bodies as received (decompressed) at
+  # path, and an index of them at path + '.idx', an ARCHIVE_ENTRY (time,
+  # offset and length of the body, status, endpoint, length of account)
+  # followed by the account per body. a body is written before its entry,
+  # so the index never points past the data; writers of other processes
+  # wait on a lock of the index. read back with entries() through mmap.
+  # archive errors are reported once and the archive is not used any more.
+  # shared by the threads of a process, see response_archive()
+
+  ENDPOINTS = list(ZeusRequest.ENDPOINTS) # codes of entries, new ones appended
+
+  def __init__(self, path):
+    self.path = path
+    self.fds = None # (data, index)
+    self.lock = threading.Lock()
+    self.broken = False
+
+  def append(self, account, endpoint, status, body):
+    import fcntl
+    import struct
+    with self.lock:
+      if self.broken: return
+      try:
+        if self.fds is None:
+          # bodies carry personal data, readable by the owner only
+          flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+          self.fds = (os.open(self.path, flags, 0o600), os.open(self.path + '.idx', flags, 0o600))
+        (data, index) = self.fds
+        name = account.encode('utf-8')[:255]
+        fcntl.flock(index, fcntl.LOCK_EX)
+        try:
+          offset = os.lseek(data, 0, os.SEEK_END)
+          os.write(data, body)
+          os.write(index, struct.pack(ARCHIVE_ENTRY, datetime.now().timestamp(), offset,
+            len(body), status, self.ENDPOINTS.index(endpoint), len(name)) + name)
+        finally:
+          fcntl.flock(index, fcntl.LOCK_UN)
+      except OSError as e:
+        print(f"Error while writing to response archive '{self.path}': {e}", file=sys.stderr)
+        self.broken = True
+
+  def close(self):
+    with self.lock:
+      if self.fds is not None:
+        for fd in self.fds: os.close(fd)
+      self.fds = None
+
+  def entries(self, account=None, endpoint=None, since=None):
+    # yields (time, account, endpoint, status, body) of bodies archived by
+    # account to endpoint at or after since (epoch seconds), whichever
+    # given; body is a memoryview of the mmap, valid while iterating
+    import mmap
+    import struct
+    size = struct.calcsize(ARCHIVE_ENTRY)
+    with open(self.path + '.idx', 'rb') as f:
+      index = f.read()
+    with open(self.path, 'rb') as f:
+      length = os.fstat(f.fileno()).st_size
+      mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if length else b''
+    view = memoryview(mm)
+    try:
+      i = 0
+      while i + size <= len(index):
+        (ts, offset, n, status, code, k) = struct.unpack_from(ARCHIVE_ENTRY, index, i)
+        name = index[i + size:i + size + k].decode('utf-8', 'replace')
+        i += size + k
+        if i > len(index) or offset + n > length: break # cut short while written
+        if (account is None or name == account) and (since is None or ts >= since) \
+            and (endpoint is None or self.ENDPOINTS[code] == endpoint):
+          yield (ts, name, self.ENDPOINTS[code], status, view[offset:offset + n])
+    finally:
+      try:
+        view.release()
+        if length: mm.close()
+      except BufferError:
+        pass # slices still held, closed once they are gone
+
+RESPONSE_ARCHIVES = {} # path -> ResponseArchive
+RESPONSE_ARCHIVES_LOCK = None
+
+def response_archive(path):
+  global RESPONSE_ARCHIVES_LOCK
+  RESPONSE_ARCHIVES_LOCK = RESPONSE_ARCHIVES_LOCK or threading.Lock()
+  with RESPONSE_ARCHIVES_LOCK:
+    return RESPONSE_ARCHIVES.setdefault(path, ResponseArchive(path))
+
+def record_cells(rec):
   s_date = rec['timestamp'].strftime('%Y-%m-%d')
   s_time = rec['timestamp'].strftime('%H:%M')
-  return "\t".join([
+  return [
     s_date, s_time, str(rec['temperature']),
     rec['symptoms'], rec['significance']
-  ])
+  ]
+
+def show_record(rec):
+  return "\t".join(record_cells(rec))
+
+def csv_cell(s):
+  # quoted as of RFC 4180 when needed
+  if any(c in s for c in ',"\r\n'): return '"' + s.replace('"', '""') + '"'
+  return s
+
+def tsv_cell(s):
+  # tabs and newlines escaped, which TSV cells cannot hold
+  return s.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def format_record(rec, fmt, account=None):
+  # a line of rec in one of SELECT_FORMATS, led by account for batches
+  cells = record_cells(rec)
+  if fmt == 'jsonl':
+    obj = {} if account is None else {'account': account}
+    obj.update(zip(RECORD_COLUMNS, cells))
+    obj['temperature'] = rec['temperature']
+    return json.dumps(obj, ensure_ascii=False)
+  if account is not None: cells.insert(0, account)
+  if fmt == 'csv': return ",".join(map(csv_cell, cells))
+  if fmt == 'tsv': return "\t".join(map(tsv_cell, cells))
+  return "\t".join(cells)
+
+def select_header(fmt, account=False):
+  # column names line of fmt, None if it has none
+  if fmt not in ('csv', 'tsv'): return None
+  return (',' if fmt == 'csv' else '\t').join((['account'] if account else []) + RECORD_COLUMNS)
+
+def select_lines(recs, output, account=None, header=False):
+  # lines of recs (any iterable in time order) as of routine_select_output;
+  # stops pulling records once limit lines are out
+  (fmt, since, limit) = output
+  if header and select_header(fmt): yield select_header(fmt)
+  n = 0
+  for rec in recs:
+    if since is not None and rec['timestamp'] < since: continue
+    yield format_record(rec, fmt, account)
+    n += 1
+    if n == limit: return
 
 def routine_args(argv):
   if len(argv) <= 1:
@@ -356,17 +1862,34 @@ def routine_args(argv):
 
   cmd = argv[1]
 
-  if len(argv) <= 2:
+  # '--name value' pairs may appear anywhere after the command
+  args = []
+  opts = {}
+  i = 2
+  while i < len(argv):
+    if argv[i].startswith('--'):
+      if len(argv) <= i+1:
+        print(f"Option '{argv[i]}' needs a value.", file=sys.stderr)
+        exit(1)
+      opts[argv[i][2:]] = argv[i+1]
+      i += 2
+    else:
+      args.append(argv[i])
+      i += 1
+
+  if not args:
     config_path = DEFAULT_CONFIG_PATH
   else:
-    config_path = argv[2]
+    config_path = args[0]
 
-  return (cmd, config_path)
+  return (cmd, config_path, opts)
 
 def load_config(path):
   with open(path, "rt") as f:
-    config_loaded = json.load(f)
+    return parse_config(json.load(f))
 
+def parse_config(config_loaded):
+  config_loaded = config_loaded.copy()
   config = {}
 
   for (k,v) in CONFIG_SCHEME.items():
@@ -386,6 +1909,19 @@ def load_config(path):
 
     config[k] = value
 
+  if urllib.parse.urlsplit(config['server_url']).scheme not in ('http', 'https'):
+    raise ValueError(f"field 'server_url' should be http(s) url but is '{config['server_url']}'")
+
+  if config['update_mode'] not in ('strict', 'optimistic'):
+    raise ValueError(f"field 'update_mode' should be 'strict' or 'optimistic' but is '{config['update_mode']}'")
+
+  if config['cache_backend'] not in ('json', 'sqlite'):
+    raise ValueError(f"field 'cache_backend' should be 'json' or 'sqlite' but is '{config['cache_backend']}'")
+
+  for k in ('timeout', 'connect_timeout', 'read_timeout', 'retries'):
+    if config[k] < 0 or (config[k] == 0 and k != 'retries'):
+      raise ValueError(f"field '{k}' should be positive but is {config[k]}")
+
   if config_loaded: # config_loaded \notin CONFIG_SCHEME
     entry = 'entry' if len(config_loaded) == 1 else 'entries'
     es = ', '.join(f"'{e}'" for e in config_loaded)
@@ -397,6 +1933,8 @@ def load_config(path):
 
 def routine_load_config(path):
   try:
+    if isinstance(path, dict): # already loaded, e.g. a line of configs.jsonl
+      return parse_config(path)
     return load_config(path)
   except (json.decoder.JSONDecodeError, ValueError) as e:
     print(f"Error while reading config: {e}.", file=sys.stderr)
@@ -406,9 +1944,102 @@ def routine_load_config(path):
     print(e, file=sys.stderr)
     exit(3)
 
-def routine_load_cache(config):
+class CacheStore:
+  # sqlite database of caches of accounts (cookies, deptcd, mbrno and
+  # session meta) keyed by username, for 'cache_backend' sqlite. each store
+  # is one transaction; bulk loading reads every account in one query.
+  # shared by the threads of a process, see cache_store()
+
+  SCHEMA = """
+    CREATE TABLE IF NOT EXISTS caches (
+      username      TEXT PRIMARY KEY,
+      cookies       TEXT NOT NULL, -- JSON object
+      deptcd        TEXT,
+      mbrno         TEXT,
+      session       TEXT,          -- JSON object or NULL
+      updated       REAL NOT NULL
+    );
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self.db = None
+    self.lock = threading.Lock()
+    self.loaded = None # username -> row, once bulk loaded, kept up by store()
+
+  def execute(self, fn):
+    # runs fn(db) in a transaction; sqlite3.Error is for the caller
+    with self.lock:
+      if self.db is None:
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL") # runs read while others write
+        self.db.executescript(self.SCHEMA)
+      with self.db:
+        return fn(self.db)
+
+  @staticmethod
+  def cache(row):
+    (cookies, deptcd, mbrno, session) = row
+    cache = {'cookies': json.loads(cookies)}
+    if deptcd is not None: cache['deptcd'] = deptcd
+    if mbrno is not None: cache['mbrno'] = mbrno
+    if session is not None: cache['session'] = json.loads(session)
+    return cache
+
+  def load(self, username, bulk=False):
+    # cache of username, {} if none; bulk reads all accounts on first call.
+    # each call gets a cache of its own, even of the same username
+    if bulk and self.loaded is None:
+      rows = self.execute(lambda db: db.execute(
+        "SELECT username, cookies, deptcd, mbrno, session FROM caches").fetchall())
+      self.loaded = {row[0]: row[1:] for row in rows}
+    if self.loaded is not None:
+      row = self.loaded.get(username)
+      return self.cache(row) if row else {}
+    row = self.execute(lambda db: db.execute(
+      "SELECT cookies, deptcd, mbrno, session FROM caches WHERE username = ?",
+      (username,)).fetchone())
+    return self.cache(row) if row else {}
+
+  def store(self, username, cache):
+    session = cache.get('session')
+    row = (json.dumps(cache.get('cookies', {})), cache.get('deptcd'), cache.get('mbrno'),
+      json.dumps(session) if session else None)
+    self.execute(lambda db: db.execute("""
+      INSERT INTO caches (username, cookies, deptcd, mbrno, session, updated)
+      VALUES (?, ?, ?, ?, ?, ?)
+      ON CONFLICT (username) DO UPDATE SET cookies = excluded.cookies,
+        deptcd = excluded.deptcd, mbrno = excluded.mbrno,
+        session = excluded.session, updated = excluded.updated
+    """, (username, *row, datetime.now().timestamp())))
+    if self.loaded is not None: self.loaded[username] = row
+
+CACHE_STORES = {} # path -> CacheStore
+CACHE_STORES_LOCK = None
+
+def cache_store(path):
+  global CACHE_STORES_LOCK
+  CACHE_STORES_LOCK = CACHE_STORES_LOCK or threading.Lock()
+  with CACHE_STORES_LOCK:
+    return CACHE_STORES.setdefault(path, CacheStore(path))
+
+def cache_location(config):
+  # path of cache of the account, '' for none
+  path = config['cache_path'].replace("~", os.environ['HOME'])
+  if config['cache_backend'] == 'sqlite' and config['cache_path'] == DEFAULT_CACHE_PATH:
+    path += '.sqlite' # not to open json cache left at the default path
+  return path
+
+def routine_load_cache(config, bulk=False):
+  # bulk, for a batch, loads caches of every account at once if it can
+  path = cache_location(config)
+  if config['cache_backend'] == 'sqlite' and path:
+    try:
+      return cache_store(path).load(config['username'], bulk)
+    except (sqlite3.Error, json.decoder.JSONDecodeError) as e:
+      print(f"Error while reading cache database '{path}': {e}", file=sys.stderr)
+      return {}
   try:
-    path = config['cache_path'].replace("~", os.environ['HOME'])
     with open(path, "rt") as f:
       return json.load(f)
   except (FileNotFoundError, json.decoder.JSONDecodeError):
@@ -419,15 +2050,98 @@ def routine_load_cache(config):
     return {}
 
 def routine_store_cache(cache, config):
+  path = cache_location(config)
+  if not path: return # no cache store
+  if config['cache_backend'] == 'sqlite':
+    try:
+      cache_store(path).store(config['username'], cache)
+    except sqlite3.Error as e:
+      print(f"Error while writing to cache database '{path}': {e}", file=sys.stderr)
+    return
+  # written aside then renamed over, never leaving a torn cache behind
+  tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
   try:
-    path = config['cache_path'].replace("~", os.environ['HOME'])
-    with open(path, "wt") as f:
+    with open(tmp, "wt") as f:
       json.dump(cache, f, indent=2)
-  except FileNotFoundError as e:
-    return # especially when path == ''; indicating no cache store
+    os.replace(tmp, path)
   except OSError as e:
     print(f"Error while writing to cache file '{path}'.", file=sys.stderr)
     print(e, file=sys.stderr)
+    try:
+      os.unlink(tmp)
+    except OSError:
+      pass
+
+def routine_report_metrics(report, config):
+  # appends the report of a run to 'metrics_path' as a JSON line
+  if not config['metrics_path']: return
+  line = json.dumps(report) + "\n"
+  try:
+    if config['metrics_path'] == '-':
+      sys.stderr.write(line)
+    else:
+      with open(config['metrics_path'].replace("~", os.environ['HOME']), "at") as f:
+        f.write(line) # single write, lines of concurrent runs do not mix
+  except OSError as e:
+    print(f"Error while writing metrics to '{config['metrics_path']}'.", file=sys.stderr)
+    print(e, file=sys.stderr)
+
+PROM_METRICS = [
+  # (name, report field, help)
+  ('emetic_last_run_timestamp_seconds', 'time', "Start of the last run."),
+  ('emetic_run_seconds', 'seconds', "Duration of the last run."),
+  ('emetic_exit_code', 'code', "Exit status of the last run."),
+  ('emetic_requests', 'requests', "Requests sent by the last run."),
+  ('emetic_connects', 'connects', "Connections opened by the last run."),
+  ('emetic_bytes_sent', 'bytes_sent', "Bytes sent by the last run."),
+  ('emetic_bytes_received', 'bytes_received', "Bytes received by the last run."),
+  ('emetic_retries', 'retries', "Requests retried by the last run."),
+  ('emetic_logins', 'logins', "Logins of the last run."),
+  ('emetic_relogins', 'relogins', "Sessions rejected during the last run."),
+  ('emetic_role_changes', 'role_changes', "Role data found changed by speculative role.do."),
+]
+
+def prom_labels(**labels):
+  esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+  return "{" + ",".join(f'{k}="{esc(v)}"' for (k, v) in labels.items()) + "}"
+
+def routine_write_prom(path, reports):
+  # writes reports of the last runs as node-exporter textfile at path,
+  # replaced at once so that the exporter never reads a partial file
+  out = []
+  for (name, field, help) in PROM_METRICS:
+    out.append(f"# HELP {name} {help}")
+    out.append(f"# TYPE {name} gauge")
+    for r in reports:
+      if isinstance(r[field], (int, float)):
+        out.append(f"{name}{prom_labels(account=r['account'], command=r['command'])} {r[field]}")
+  out.append("# HELP emetic_phase_seconds Time spent in each phase of the last run.")
+  out.append("# TYPE emetic_phase_seconds gauge")
+  for r in reports:
+    for (phase, seconds) in r['phases'].items():
+      labels = prom_labels(account=r['account'], command=r['command'], phase=phase)
+      out.append(f"emetic_phase_seconds{labels} {seconds:.6f}")
+
+  path = path.replace("~", os.environ['HOME'])
+  tmp = f"{path}.{os.getpid()}.tmp"
+  try:
+    with open(tmp, "wt") as f:
+      f.write("\n".join(out) + "\n")
+    os.replace(tmp, path)
+  except OSError as e:
+    print(f"Error while writing metrics to '{path}'.", file=sys.stderr)
+    print(e, file=sys.stderr)
+
+def routine_open_store(config):
+  path = config['store_path'].replace("~", os.environ['HOME'])
+  if not path: return None # no local store
+  return RecordStore(path, config['username'])
+
+def routine_open_archive(config):
+  # (ResponseArchive, account) of ZeusRequest.archive, None if not kept
+  path = config['archive_path'].replace("~", os.environ['HOME'])
+  if not path: return None
+  return (response_archive(path), config['username'])
 
 def routine_login(zrq, config):
   if config['verbose']: print("try loging in... ", end='', flush=True)
@@ -436,6 +2150,7 @@ def routine_login(zrq, config):
     ret = zrq.request_login(config['username'], password)
   except ConnectionError as e:
     if config['verbose']: print("failed")
+    if transient(e): raise # retried by routine_execute_command
     print(e, file=sys.stderr)
     exit(4)
   if config['verbose']: print("success")
@@ -446,6 +2161,7 @@ def routine_role(zrq, config):
     (deptcd, mbrno) = zrq.request_role()
   except ConnectionError as e:
     if config['verbose']: print("failed")
+    if transient(e): raise
     print(e, file=sys.stderr)
     exit(4)
   if config['verbose']: print("success")
@@ -453,52 +2169,396 @@ def routine_role(zrq, config):
   zrq.cache['deptcd'] = deptcd
   zrq.cache['mbrno'] = mbrno
 
-def execute_command(zrq, config, cmd, ret=False):
+# session meta of cache['session'], all in epoch seconds
+#   'obtained' when logged in, 'used' when last accepted by the server,
+#   'alive' the longest idle time the session was seen to survive and
+#   'lifetime' the shortest idle time it was seen to expire after (or None)
+# sessions are refreshed before use once idle for SESSION_MARGIN of lifetime
+
+def session_stale(cache, now):
+  session = cache.get('session')
+  if not session: return False # unknown, just try it
+  idle = now - session['used']
+  lifetime = session.get('lifetime')
+  return lifetime is not None and idle >= SESSION_MARGIN * lifetime \
+    and idle > session.get('alive', 0)
+
+def session_alive(cache):
+  session = cache.get('session')
+  if not session: return
+  now = datetime.now().timestamp()
+  session['alive'] = max(session.get('alive', 0), now - session['used'])
+  if session.get('lifetime') is not None and session['alive'] >= session['lifetime']:
+    session['lifetime'] = None # server changed its mind, learn it again
+  session['used'] = now
+
+def session_expired(cache):
+  session = cache.get('session')
+  if not session: return
+  idle = datetime.now().timestamp() - session['used']
+  if session.get('lifetime') is None or idle < session['lifetime']:
+    session['lifetime'] = idle
+
+class ZeusSessions:
+  # logs in on behalf of workers sharing credentials; only one of them
+  # logs in at a time and the others adopt the session it obtained
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.locks = {}    # username -> lock
+    # username -> (cookies, deptcd, mbrno, session, role_check); role data
+    # of a login speculating is only confirmed by its role_check
+    self.accounts = {}
+
+  def account_lock(self, username):
+    with self.lock:
+      return self.locks.setdefault(username, threading.Lock())
+
+  def adopt(self, zrq, config):
+    # takes over session logged in by another worker, if any
+    shared = self.accounts.get(config['username'])
+    if shared is None or shared[0].get('ZSESSIONID') == zrq.cookies.get('ZSESSIONID'):
+      return False
+    (cookies, deptcd, mbrno, session, role_check) = shared
+    for (cf, cv) in cookies.items(): zrq.set_cookie(cf, cv)
+    zrq.cache.update(deptcd=deptcd, mbrno=mbrno, session=session.copy())
+    # settled by the adopter as well, before anything relies on the role data
+    if role_check is not None: zrq.role_check = role_check
+    if config['verbose']: print("using session of another worker")
+    return True
+
+  def current(self, zrq):
+    # whether zrq has a session not about to expire
+    return 'ZSESSIONID' in zrq.cookies and 'deptcd' in zrq.cache and 'mbrno' in zrq.cache \
+      and not session_stale(zrq.cache, datetime.now().timestamp())
+
+  def obtained(self, zrq, config, session):
+    # zrq has logged in; session is meta of the previous session
+    zrq.metrics.count('logins')
+    now = datetime.now().timestamp()
+    zrq.cache['session'] = dict(session, obtained=now, used=now) # keep learnt lifetime
+    self.accounts[config['username']] = (zrq.cookies.copy(),
+      zrq.cache['deptcd'], zrq.cache['mbrno'], zrq.cache['session'].copy(), zrq.role_check)
+
+  def login(self, zrq, config):
+    session = zrq.cache.get('session') or {}
+    routine_login(zrq, config)
+    speculate = config['speculative_role'] and 'deptcd' in zrq.cache and 'mbrno' in zrq.cache
+    if speculate and zrq.speculate_role():
+      if config['verbose']: print("checking role data alongside")
+    else:
+      routine_role(zrq, config)
+    self.obtained(zrq, config, session)
+
+  def refresh(self, zrq, config):
+    # logs in ahead when the session is missing or about to expire
+    with self.account_lock(config['username']):
+      if self.adopt(zrq, config) or self.current(zrq): return
+      if config['verbose']: print("session missing or about to expire")
+      self.login(zrq, config)
+
+  def relogin(self, zrq, config):
+    # the session of zrq has been rejected
+    with self.account_lock(config['username']):
+      if self.adopt(zrq, config): return
+      self.login(zrq, config)
+
+def routine_select_months(opts):
+  # months of '--from' to '--to' ('YYYY-MM'), None if neither given;
+  # '--since YYYY-MM-DD' starts the range at its month unless '--from' does
+  if 'from' not in opts and 'to' not in opts and 'since' not in opts: return None
+  try:
+    this = datetime.now(ZeusRequest.TIME_ZONE).strftime('%Y-%m')
+    last = datetime.strptime(opts.get('to', this), '%Y-%m')
+    first = opts['since'][:7] if 'since' in opts else last.strftime('%Y-%m')
+    first = datetime.strptime(opts.get('from', first), '%Y-%m')
+    assert first <= last
+  except (ValueError, AssertionError):
+    print("Invalid month range, expecting '--from YYYY-MM --to YYYY-MM'.", file=sys.stderr)
+    exit(1)
+  months = []
+  while first <= last:
+    months.append(first.strftime('%Y%m'))
+    first = (first + timedelta(days=32)).replace(day=1)
+  return months
+
+def routine_select_output(opts):
+  # (format, since datetime or None, limit or None) of select options
+  fmt = opts.get('format', 'text')
+  if fmt not in SELECT_FORMATS:
+    print(f"Unknown format '{fmt}', one of {', '.join(SELECT_FORMATS)}.", file=sys.stderr)
+    exit(1)
+  try:
+    since = None
+    if 'since' in opts:
+      since = datetime.strptime(opts['since'], '%Y-%m-%d').replace(tzinfo=ZeusRequest.TIME_ZONE)
+    limit = int(opts['limit']) if 'limit' in opts else None
+    assert limit is None or limit > 0
+  except (ValueError, AssertionError):
+    print("Invalid '--since' or '--limit', expecting YYYY-MM-DD and a positive count.", file=sys.stderr)
+    exit(1)
+  return (fmt, since, limit)
+
+def half_day_checkpoint():
+  # start of this half-day, a record since then needs no upload
+  now = datetime.now(ZeusRequest.TIME_ZONE)
+  checkpoint = datetime.combine(now, time(12,0), now.tzinfo)
+  if (now - checkpoint).total_seconds() < 0:
+    checkpoint = datetime.combine(now, time(0,0), now.tzinfo)
+  return checkpoint
+
+def answered_locally(cmd, config, store):
+  # whether cmd is done from the local store alone, never reaching the
+  # server: 'check' and 'update' of a half-day recorded already
+  return (cmd in ('check', 'update') and config['local_check'] and store
+    and store.recorded_since(half_day_checkpoint()))
+
+def optimistic_update(zrq, config):
+  # whether 'update' may save without asking the server first: the local
+  # store has fetched this month, has no record of this half-day, and no
+  # save of this command may have reached the server already
+  if config['update_mode'] != 'optimistic' or zrq.store is None or zrq.unsafe:
+    return False
+  checkpoint = half_day_checkpoint()
+  return zrq.store.fetched_month(checkpoint.strftime('%Y%m')) \
+    and not zrq.store.recorded_since(checkpoint)
+
+def execute_command(zrq, config, cmd, ret=False, opts={}, out=None):
+  # out, of batches, is (account, write) select lines go to, led by account
   if cmd == "save":
+    zrq.before_request() # logs in first, not amid the progress line
     if config['verbose']: print("uploading temperature data... ", end='', flush=True)
-    ret = zrq.request_save()
+    saved = zrq.request_save()
     if config['verbose']: print("success")
-    if ret: return True
+    if ret: return saved # the response, see save_notice
 
   elif cmd == "select":
-    if config['verbose']: print("loading temperature data... ", end='', flush=True)
-    recs = zrq.request_select()
-    if config['verbose']: print("success")
-    if ret: return recs
-    for rec in recs: print(show_record(rec)) # TODO only few records?
+    months = routine_select_months(opts)
+    output = routine_select_output(opts)
+    zrq.before_request() # logs in first, not amid the progress line
+    if ret:
+      if config['verbose']: print("loading temperature data... ", end='', flush=True)
+      recs = zrq.request_select() if months is None else zrq.request_select_range(months)
+      if config['verbose']: print("success")
+      return recs
+
+    # written as months come, never holding more than a few of them
+    (account, write) = out or (None, print)
+    verbose = config['verbose']
+    if verbose: print("loading temperature data... ", end='', flush=True)
+    stream = zrq.select_stream(months or [datetime.now(zrq.TIME_ZONE).strftime('%Y%m')])
+    n = 0
+    try:
+      for line in select_lines((rec for (_, recs) in stream for rec in recs), output,
+          account, header=out is None):
+        if verbose and n == 0: print("success")
+        n += 1
+        if n > zrq.streamed: # not again when tried again after an error
+          write(line)
+          zrq.streamed = n
+    finally:
+      stream.close()
+    if verbose and n == 0: print("success")
 
   elif cmd == "check":
-    recs = execute_command(zrq, config, "select", ret=True)
+    checkpoint = half_day_checkpoint()
+    if config['local_check'] and zrq.store and zrq.store.recorded_since(checkpoint):
+      if config['verbose']: print("temperature already recorded (local store)")
+      if ret: return True
+      return
 
-    now = datetime.now(zrq.TIME_ZONE)
-    checkpoint = datetime.combine(now, time(12,0), now.tzinfo)
-    if (now - checkpoint).total_seconds() < 0:
-      checkpoint = datetime.combine(now, time(0,0), now.tzinfo)
-
-    check = any(rec['timestamp'] >= checkpoint for rec in recs)
+    recs = execute_command(zrq, config, "select", ret=True)
+    check = any(rec['timestamp'] >= checkpoint for rec in records_newest_first(recs))
     if config['verbose']: print("temperature already recorded" if check else "no record yet")
     if ret: return check # TODO report with exit status?
 
   elif cmd == "update":
-    if not execute_command(zrq, config, "check", ret=True):
+    if optimistic_update(zrq, config):
+      try:
+        notice = zrq.save_notice(execute_command(zrq, config, 'save', ret=True))
+      except ConnectionError as e:
+        if transient(e) or isinstance(e, ConnectionRefusedError): raise
+        # rejected, e.g. as a duplicate; fine if recorded after all
+        if config['verbose']: print(f"rejected, {e}")
+        if not execute_command(zrq, config, "check", ret=True): raise
+        return
+      if notice is not None:
+        # accepted with a note, e.g. of a record already there; the store
+        # learns what the server has instead of trusting its own
+        if config['verbose']: print(f"server noted ErrorCode {notice}, reloading this month")
+        execute_command(zrq, config, "select", ret=True)
+    elif not execute_command(zrq, config, "check", ret=True):
       execute_command(zrq, config, 'save')
 
   else: raise NotImplementedError(cmd)
 
-def routine_execute_command(zrq, config, cmd, chance=2):
+def retry_delay(zrq, config, cmd, e, attempts):
+  # seconds to wait after attempts failed with transient error e, or gives
+  # up with exit status 9 when out of retries or deadline
+  # full jitter, so that accounts of a batch do not retry in step
+  delay = random.uniform(0, min(RETRY_BACKOFF * 2 ** attempts, RETRY_BACKOFF_MAX))
+  left = zrq.deadline - perf_counter()
+  if attempts > config['retries'] or delay >= left or (cmd == 'save' and zrq.unsafe):
+    # save is not sent again once it may have been done; update checks first
+    if config['verbose']: print("failed")
+    print(f"Giving up '{cmd}' after {attempts} attempt(s): {e}", file=sys.stderr)
+    exit(9)
+  if config['verbose']: print(f"{e}; retrying in {delay:.1f}s")
+  zrq.metrics.count('retries')
+  return delay
+
+def routine_execute_command(zrq, config, cmd, chance=2, ret=False, sessions=None, opts={}, out=None):
+  sessions = sessions or ZeusSessions()
+  # session refreshed before the first request to the server, if any
+  zrq.on_request = lambda: sessions.refresh(zrq, config)
+  zrq.deadline = perf_counter() + config['timeout']
+  zrq.unsafe = False
+  zrq.streamed = 0 # lines of select written
+  relogin = False
+  attempts = 1
   while chance > 0:
     try:
-      execute_command(zrq, config, cmd)
-      break # success
-    except ConnectionRefusedError: # re-login needed
-      if config['verbose']: print("login cookie rejected")
-      chance -= 1
-      routine_login(zrq, config)
-      routine_role(zrq, config)
+      if relogin: sessions.relogin(zrq, config)
+      relogin = False
+      ret = execute_command(zrq, config, cmd, ret, opts, out)
+      zrq.settle_role() # not left running, e.g. when nothing needed it
+      if zrq.on_request is None: session_alive(zrq.cache)
+      zrq.on_request = None
+      return ret
+    except (OSError, http.client.HTTPException) as e:
+      if isinstance(e, ConnectionRefusedError) and e.errno is None: # re-login needed
+        if config['verbose']: print("login cookie rejected")
+        chance -= 1
+        zrq.metrics.count('relogins')
+        session_expired(zrq.cache)
+        relogin = True
+        continue
+      if not transient(e): raise
+      zrq.close()
+      sleep(retry_delay(zrq, config, cmd, e, attempts))
+      attempts += 1
     except NotImplementedError as e:
       print(f"Unknown command '{cmd}'.", file=sys.stderr)
       print(f"Use 'help' command to see usage.", file=sys.stderr)
       exit(5)
+  routine_session_rejected(config, cmd)
+
+def routine_session_rejected(config, cmd):
+  # every session logged in for cmd was rejected right away
+  if config['verbose']: print("failed")
+  print(f"Giving up '{cmd}': the server rejects sessions just logged in.", file=sys.stderr)
+  exit(10)
+
+class AsyncZeusSessions(ZeusSessions):
+  # ZeusSessions for AsyncZeusRequest of one event loop
+
+  def account_lock(self, username):
+    return self.locks.setdefault(username, asyncio.Lock())
+
+  async def login(self, zrq, config):
+    session = zrq.cache.get('session') or {}
+    await async_routine_login(zrq, config)
+    self.obtained(zrq, config, session)
+
+  async def refresh(self, zrq, config):
+    async with self.account_lock(config['username']):
+      if self.adopt(zrq, config) or self.current(zrq): return
+      await self.login(zrq, config)
+
+  async def relogin(self, zrq, config):
+    async with self.account_lock(config['username']):
+      if self.adopt(zrq, config): return
+      await self.login(zrq, config)
+
+async def async_routine_login(zrq, config):
+  # routine_login and routine_role on AsyncZeusRequest, without progress
+  try:
+    password = base64.b64decode(config['b64_password'].encode('utf-8'))
+    await zrq.request_login(config['username'], password)
+    (deptcd, mbrno) = await zrq.request_role()
+  except ConnectionError as e:
+    if transient(e): raise
+    print(e, file=sys.stderr)
+    exit(4)
+  zrq.cache['deptcd'] = deptcd
+  zrq.cache['mbrno'] = mbrno
+
+async def async_execute_command(zrq, config, cmd, opts={}, out=None):
+  # execute_command on AsyncZeusRequest, returning the result; select
+  # lines are written to out as months come if given, else returned
+  if cmd == "save":
+    return bool(await zrq.request_save())
+  elif cmd == "select":
+    months = routine_select_months(opts)
+    if out is None:
+      if months is None: return await zrq.request_select()
+      return await zrq.request_select_range(months)
+    (account, write) = out
+    (fmt, since, limit) = routine_select_output(opts)
+    stream = zrq.select_stream(months or [datetime.now(zrq.TIME_ZONE).strftime('%Y%m')])
+    n = 0
+    try:
+      async for (_, recs) in stream:
+        left = None if limit is None else limit - n
+        for line in select_lines(recs, (fmt, since, left), account):
+          n += 1
+          if n > zrq.streamed: # not again when tried again after an error
+            write(line)
+            zrq.streamed = n
+        if n == limit: break
+    finally:
+      await stream.aclose()
+  elif cmd == "check":
+    checkpoint = half_day_checkpoint()
+    if config['local_check'] and zrq.store and zrq.store.recorded_since(checkpoint):
+      return True
+    recs = await async_execute_command(zrq, config, "select")
+    return any(rec['timestamp'] >= checkpoint for rec in records_newest_first(recs))
+  elif cmd == "update":
+    if optimistic_update(zrq, config):
+      try:
+        notice = zrq.save_notice(await zrq.request_save())
+      except ConnectionError as e:
+        if transient(e) or isinstance(e, ConnectionRefusedError): raise
+        if not await async_execute_command(zrq, config, "check"): raise
+        return
+      if notice is not None: await async_execute_command(zrq, config, "select")
+    elif not await async_execute_command(zrq, config, "check"):
+      await async_execute_command(zrq, config, "save")
+  else: raise NotImplementedError(cmd)
+
+async def async_routine_execute_command(zrq, config, cmd, chance=2, sessions=None, opts={}, out=None):
+  # routine_execute_command on AsyncZeusRequest
+  sessions = sessions or AsyncZeusSessions()
+  zrq.on_request = lambda: sessions.refresh(zrq, config)
+  zrq.deadline = perf_counter() + config['timeout']
+  zrq.unsafe = False
+  zrq.streamed = 0
+  relogin = False
+  attempts = 1
+  while chance > 0:
+    try:
+      if relogin: await sessions.relogin(zrq, config)
+      relogin = False
+      ret = await async_execute_command(zrq, config, cmd, opts, out)
+      if zrq.on_request is None: session_alive(zrq.cache)
+      zrq.on_request = None
+      return ret
+    except (OSError, http.client.HTTPException) as e:
+      if isinstance(e, ConnectionRefusedError) and e.errno is None: # re-login needed
+        chance -= 1
+        zrq.metrics.count('relogins')
+        session_expired(zrq.cache)
+        relogin = True
+        continue
+      if not transient(e): raise
+      zrq.close()
+      await asyncio.sleep(retry_delay(zrq, config, cmd, e, attempts))
+      attempts += 1
+    except NotImplementedError as e:
+      print(f"Unknown command '{cmd}'.", file=sys.stderr)
+      exit(5)
+  routine_session_rejected(config, cmd)
 
 def routine_config_command(path):
   if not path:
@@ -518,18 +2578,1144 @@ def routine_config_command(path):
     print(e, file=sys.stderr)
     exit(6)
 
+def batch_sources(source):
+  # yields (name, config_path_or_dict) for each account of the batch
+  if os.path.isdir(source):
+    for name in sorted(os.listdir(source)):
+      path = os.path.join(source, name)
+      if os.path.isfile(path) and not name.startswith('.'):
+        yield (name, path)
+    return
+
+  with sys.stdin if source == '-' else open(source, "rt") as f:
+    for (n, line) in enumerate(f, 1):
+      if not line.strip(): continue
+      try:
+        config_loaded = json.loads(line)
+      except json.decoder.JSONDecodeError as e:
+        config_loaded = e # reported by the worker, not to abort the batch
+      if isinstance(config_loaded, dict):
+        name = config_loaded.get('username', f"line {n}")
+      else:
+        name = f"line {n}"
+      yield (str(name), config_loaded)
+
+def routine_batch_config(name, source):
+  # config of an account of the batch, source as of batch_sources
+  if isinstance(source, Exception):
+    print(f"Error while reading config of '{name}': {source}.", file=sys.stderr)
+    exit(3)
+  config = routine_load_config(source)
+  config['verbose'] = False # progress of concurrent accounts would interleave
+  if config['cache_path'] == DEFAULT_CACHE_PATH and config['cache_backend'] == 'json':
+    # accounts must not share a cache file
+    config['cache_path'] += '.' + config['username']
+  return config
+
+def routine_batch_worker(name, source, cmd, sessions, opts, limiter=None, due=None, write=print):
+  # runs one account of the batch, not before perf_counter() due if given,
+  # writing select lines with write as they come; returns (name, exit code, result, elapsed, config or None if not loaded,
+  # metrics report)
+  if due is not None: sleep(max(due - perf_counter(), 0))
+  start = perf_counter()
+  metrics = Metrics()
+  ret = None
+  config = None
+  try:
+    with metrics.phase('config'):
+      config = routine_batch_config(name, source)
+    with ZeusRequest({}, config['server_url'], routine_open_store(config), metrics,
+        (config['connect_timeout'], config['read_timeout'])) as zrq:
+      zrq.limiter = limiter
+      zrq.archive = routine_open_archive(config)
+      if not answered_locally(cmd, config, zrq.store): zrq.preconnect()
+      with metrics.phase('cache'):
+        zrq.set_cache(routine_load_cache(config, bulk=True))
+      ret = routine_execute_command(zrq, config, cmd, ret=cmd != 'select', sessions=sessions,
+        opts=opts, out=(name, write))
+      with metrics.phase('cache'):
+        routine_store_cache(zrq.get_cache(), config)
+    code = 0
+  except SystemExit as e:
+    code = e.code
+  except Exception as e:
+    print(f"Error while running '{cmd}' for '{name}': {e!r}", file=sys.stderr)
+    code = 1
+  report = metrics.report(config['username'] if config else name, cmd, code)
+  if config: routine_report_metrics(report, config)
+  return (name, code, ret, perf_counter() - start, config, report)
+
+async def async_batch_worker(name, source, cmd, sessions, opts, limiter, due, slots, write):
+  # routine_batch_worker on AsyncZeusRequest, running while holding one of
+  # slots; exit() of routines is caught here, before leaving the coroutine
+  await asyncio.sleep(max(due - perf_counter(), 0))
+  async with slots:
+    start = perf_counter()
+    metrics = Metrics()
+    ret = None
+    config = None
+    try:
+      with metrics.phase('config'):
+        config = routine_batch_config(name, source)
+      async with AsyncZeusRequest({}, config['server_url'], routine_open_store(config), metrics,
+          (config['connect_timeout'], config['read_timeout'])) as zrq:
+        zrq.limiter = limiter
+        zrq.archive = routine_open_archive(config)
+        with metrics.phase('cache'):
+          zrq.set_cache(routine_load_cache(config, bulk=True))
+        ret = await async_routine_execute_command(zrq, config, cmd, sessions=sessions,
+          opts=opts, out=(name, write) if cmd == 'select' else None)
+        with metrics.phase('cache'):
+          routine_store_cache(zrq.get_cache(), config)
+      code = 0
+    except SystemExit as e:
+      code = e.code
+    except Exception as e:
+      print(f"Error while running '{cmd}' for '{name}': {e!r}", file=sys.stderr)
+      code = 1
+    report = metrics.report(config['username'] if config else name, cmd, code)
+    if config: routine_report_metrics(report, config)
+    return (name, code, ret, perf_counter() - start, config, report)
+
+async def async_batch(cmd, sources, dues, opts, limiter, workers, finished, write):
+  # runs accounts of the batch in this event loop, workers at once
+  sessions = AsyncZeusSessions()
+  slots = asyncio.Semaphore(workers)
+  runs = [async_batch_worker(name, src, cmd, sessions, opts, limiter, due, slots, write)
+    for ((name, src), due) in zip(sources, dues)]
+  for run in asyncio.as_completed(runs):
+    finished(*await run)
+
+def routine_batch_command(cmd, source, opts):
+  engine = opts.get('engine', 'threads')
+  if engine not in ('threads', 'async'):
+    print(f"Unknown engine '{engine}', either 'threads' or 'async'.", file=sys.stderr)
+    exit(1)
+  try:
+    workers = int(opts.get('workers', BATCH_WORKERS if engine == 'threads' else BATCH_ASYNC_WORKERS))
+    assert workers > 0
+  except (ValueError, AssertionError):
+    print(f"Invalid worker count '{opts['workers']}'.", file=sys.stderr)
+    exit(1)
+  try:
+    rps = float(opts['rps']) if 'rps' in opts else None
+    connections = int(opts['connections']) if 'connections' in opts else None
+    spread = float(opts.get('spread', 0))
+    slow = float(opts.get('slow', BATCH_SLOW))
+    assert (rps is None or rps > 0) and (connections is None or connections > 0)
+    assert spread >= 0 and slow > 0
+  except (ValueError, AssertionError):
+    print("Invalid '--rps', '--connections', '--spread' or '--slow'.", file=sys.stderr)
+    exit(1)
+  if engine == 'async':
+    # an account holds a connection while it runs
+    workers = min(workers, connections or workers)
+  limiter = RateLimiter(rps, connections, slow) if rps or connections else None
+
+  output = routine_select_output(opts) if cmd == 'select' else ('text', None, None)
+  # with records in another format on stdout, the rest goes to stderr
+  log = sys.stdout if output[0] == 'text' else sys.stderr
+  if select_header(output[0]): print(select_header(output[0], account=True))
+
+  start = perf_counter()
+  failed = 0
+  sessions = ZeusSessions() # accounts sharing credentials log in once
+  proms = {} # prom_path -> reports of accounts, written once at the end
+
+  def finished(name, code, ret, elapsed, config, report):
+    nonlocal failed
+    if config and config['prom_path']:
+      proms.setdefault(config['prom_path'], []).append(report)
+    if code != 0:
+      failed += 1
+      status = "failed"
+    elif cmd == 'check':
+      status = "recorded" if ret else "not recorded"
+    else:
+      status = "ok"
+    with lock:
+      print(f"{name}\t{code}\t{status}\t{elapsed:.2f}s", file=log, flush=True)
+
+  lock = threading.Lock()
+  def write(line):
+    # a select line of an account, as its months come; lines are whole
+    # though accounts interleave
+    with lock:
+      print(line)
+
+  try:
+    sources = list(batch_sources(source))
+    # starts spread evenly over the window, in order so that the pool
+    # never holds a later account waiting while an earlier one is due
+    dues = [start + spread * i / len(sources) for i in range(len(sources))]
+    if engine == 'async':
+      asyncio.run(async_batch(cmd, sources, dues, opts, limiter, workers, finished, write))
+    else:
+      with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        # as_completed lets go of each future it yields
+        for future in concurrent.futures.as_completed([
+            pool.submit(routine_batch_worker, name, src, cmd, sessions, opts, limiter, due, write)
+            for ((name, src), due) in zip(sources, dues)]):
+          finished(*future.result())
+  except OSError as e:
+    print(f"Error while reading batch configs at '{source}'.", file=sys.stderr)
+    print(e, file=sys.stderr)
+    exit(3)
+
+  for (path, reports) in proms.items():
+    routine_write_prom(path, reports)
+
+  total = len(sources)
+  rate = f", ended at {limiter.rate:.1f} req/s" if limiter and limiter.rate else ""
+  print(f"{total} accounts, {failed} failed, {perf_counter() - start:.2f}s wall-clock{rate}", file=log)
+  if failed: exit(7)
+
+def bench_ssv_payload(rows, datasets):
+  # synthetic select.do response: extra datasets with const columns
+  # then dsMain of rows records, with '\x03' nulls sprinkled in
+  ssv = NexacroSsvEncoder()
+  ssv.begin()
+  ssv.variable('ErrorCode:int', 0)
+  for d in range(datasets):
+    ssv.dataset(f"dsExtra{d}", ["CD:STRING(8)", "VAL:FLOAT", "NOTE:STRING(64)"],
+      [("DS_NO:INT", d), ("DS_NM:STRING(16)", "extra")])
+    for r in range(16):
+      ssv.row([f"C{r:03d}", r/4, None if r % 3 else "note"])
+    ssv.end()
+  ssv.dataset("dsMain", ZEUS_SELECT_COLUMNS)
+  for r in range(rows):
+    (day, half) = divmod(r, 2)
+    ssv.row(["D0000123", "홍길동", f"2{r % 10000:07d}",
+      f"2026{(day // 28) % 12 + 1:02d}{day % 28 + 1:02d}",
+      "09:30" if half else "19:45", f"{36 + r % 10 / 10:.1f}",
+      *(None if (r + k) % 4 else "Y" for k in range(6)),
+      None if r % 5 else "mild headache", "AA", None])
+  ssv.end()
+  return ssv.getvalue()
+
+def bench_stage(fn, size, rows, repeat):
+  # best of repeat runs for throughput, then one traced run for memory;
+  # retained_blocks counts memory blocks still held by what the stage
+  # returned, not all it allocated on the way
+  best = None
+  for _ in range(repeat):
+    start = perf_counter()
+    fn()
+    elapsed = perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+
+  tracemalloc.start()
+  try:
+    ret = fn()
+    (_, peak) = tracemalloc.get_traced_memory()
+    retained = sum(st.count for st in tracemalloc.take_snapshot().statistics('filename'))
+    del ret
+  finally:
+    tracemalloc.stop()
+
+  best = max(best, 1e-9)
+  return {
+    'seconds': best,
+    'mb_per_s': size / best / 1e6 if size else None,
+    'rows_per_s': rows / best if rows else None,
+    'peak_kib': peak / 1024,
+    'retained_blocks': retained,
+  }
+
+def bench_stages(rows, datasets, repeat):
+  payload = bench_ssv_payload(rows, datasets)
+  size = len(payload)
+  dsmain = {b'dsMain': [3, 4, 5, 6, 7, 8, 9, 10, 11, 12]}
+  gzipped = zlib.compress(payload, wbits=16 + zlib.MAX_WBITS)
+
+  info = [
+    ('WMONID', "A1b2C3d4E5f"), ('dept_cd', "D0000123"), ('mbr_no', "20261234"),
+    ('chk_dt', "2026-10-17"), ('temp', "36.5"),
+    *((f'sympt_{k}', 'N') for k in range(1, 7)),
+    ('spc_ctnt', ""), ('gubun', ZeusRequest.SSV_GUBUN), ('pg_key', ZeusRequest.SSV_PGKEY),
+    ('page_open_time', ""), ('page_open_time_on', "20261017101500000000"),
+  ]
+  encodes = max(rows, 1)
+  # as ZeusRequest.ssv_body, with the constants in the template
+  fill = NexacroSsvEncoder().template([(vid, None if (vid, val) not in
+    ZeusRequest.SSV_BODIES['save'] else val) for (vid, val) in info])
+  values = {vid: val for (vid, val) in info if (vid, val) not in ZeusRequest.SSV_BODIES['save']}
+  encode_size = len(fill(**values)) * encodes
+
+  config = {k: (None if isinstance(v, type) else v) for (k, v) in CONFIG_SCHEME.items()}
+  config['username'] = "bench"; config['b64_password'] = "YmVuY2g="
+  config_size = len(json.dumps(config))
+  loads = max(rows // 10, 1)
+
+  with tempfile.NamedTemporaryFile("wt", suffix=".json") as f, ZeusRequest({}) as zrq:
+    json.dump(config, f)
+    f.flush()
+    stages = [
+      ('encode', lambda: [fill(**values) for _ in range(encodes)],
+        encode_size, encodes),
+      ('encode-rows', lambda: bench_ssv_payload(rows, datasets), size, rows),
+      ('decode', lambda: nexacro_ssv_decode(payload), size, rows),
+      ('decode-stream', lambda: nexacro_ssv_decode(io.BytesIO(payload)), size, rows),
+      ('decode-columns', lambda: nexacro_ssv_decode(payload, columns=dsmain), size, rows),
+      ('decode-gzip', lambda: nexacro_ssv_decode(ContentDecoder(io.BytesIO(gzipped), 'gzip')),
+        size, rows),
+      ('select', lambda: zrq.decode_select(payload), size, rows),
+      ('select-fields', lambda: [show_record(rec) for rec in zrq.decode_select(payload)],
+        size, rows),
+      ('load_config', lambda: [load_config(f.name) for _ in range(loads)],
+        config_size * loads, loads),
+    ]
+    return {name: bench_stage(fn, sz, n, repeat) for (name, fn, sz, n) in stages}
+
+def bench_startup(runs):
+  # median wall time of cold 'emetic <command>' processes less that of the
+  # bare interpreter, in ms, for commands which need no network
+  import subprocess
+  def median(args):
+    times = []
+    for _ in range(runs):
+      start = perf_counter()
+      subprocess.run(args, stdout=subprocess.DEVNULL, check=True)
+      times.append(perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+  # run as installed by Makefile, imported from bytecode cached in __pycache__
+  import py_compile
+  try:
+    py_compile.compile(__file__, doraise=True)
+  except (OSError, py_compile.PyCompileError):
+    pass # measured compiling every time then
+  (path, module) = os.path.split(os.path.splitext(os.path.abspath(__file__))[0])
+  launcher = f"import sys; sys.path.insert(0, {path!r}); import {module}; {module}.main(sys.argv)"
+  base = median([sys.executable, '-c', 'pass'])
+  return {' '.join(repr(a) if not a else a for a in cmd):
+    (median([sys.executable, '-c', launcher, *cmd]) - base) * 1000
+    for cmd in [['version'], ['help'], ['config', '']]}
+
+def routine_bench_command(opts):
+  if 'startup' in opts:
+    try:
+      budget = float(opts['startup'])
+      runs = int(opts.get('repeat', 11))
+      assert runs > 0
+    except (ValueError, AssertionError):
+      print("Invalid bench option.", file=sys.stderr)
+      exit(1)
+    over = []
+    for (cmd, ms) in bench_startup(runs).items():
+      print(f"{cmd:<16}{ms:>8.1f} ms")
+      if ms > budget: over.append(cmd)
+    if over:
+      print(f"Slower to start than {budget} ms: {', '.join(over)}.", file=sys.stderr)
+      exit(8)
+    return
+
+  try:
+    rows = int(opts.get('rows', 10000))
+    datasets = int(opts.get('datasets', 4))
+    repeat = int(opts.get('repeat', 5))
+    tolerance = float(opts.get('tolerance', 0.1))
+    assert rows >= 0 and datasets >= 0 and repeat > 0
+  except (ValueError, AssertionError):
+    print("Invalid bench option.", file=sys.stderr)
+    exit(1)
+
+  baseline = None
+  if 'baseline' in opts:
+    try:
+      with open(opts['baseline'], "rt") as f:
+        baseline = json.load(f)['stages']
+    except (OSError, ValueError, KeyError) as e:
+      print(f"Error while reading bench baseline '{opts['baseline']}'.", file=sys.stderr)
+      print(e, file=sys.stderr)
+      exit(3)
+
+  stages = bench_stages(rows, datasets, repeat)
+
+  regressed = []
+  for (name, st) in stages.items():
+    base = (baseline or {}).get(name)
+    if base is None: continue
+    st['change'] = base['seconds'] / st['seconds'] - 1 # + faster, - slower
+    if st['change'] < -tolerance: regressed.append(name)
+
+  if opts.get('format') == 'json':
+    json.dump({'version': VERSION_STR, 'python': sys.version.split()[0],
+      'rows': rows, 'datasets': datasets, 'stages': stages}, sys.stdout)
+    print()
+  else:
+    print(f"{'stage':<16}{'MB/s':>10}{'rows/s':>12}{'peak KiB':>11}{'retained':>10}"
+      + (f"{'change':>9}" if baseline else ""))
+    for (name, st) in stages.items():
+      mbs = f"{st['mb_per_s']:.1f}" if st['mb_per_s'] else "-"
+      rps = f"{st['rows_per_s']:.0f}" if st['rows_per_s'] else "-"
+      line = f"{name:<16}{mbs:>10}{rps:>12}{st['peak_kib']:>11.1f}{st['retained_blocks']:>10}"
+      if 'change' in st: line += f"{st['change']:>+9.1%}"
+      print(line)
+
+  if regressed:
+    print(f"Slower than baseline: {', '.join(regressed)}.", file=sys.stderr)
+    exit(8)
+
+
+class ProfileMetrics(Metrics):
+  # Metrics which also profiles the phases of the main thread, for
+  # 'profile': a cProfile.Profile and allocation sites (by tracemalloc
+  # snapshots) per phase. time of a nested phase counts to that phase
+  # only, time outside of any phase to 'other'. other threads, such as
+  # months of a range, are timed but not profiled.
+  # lazy modules are imported first, so that imports neither show in the
+  # profiles nor fill the snapshots, which take time by live blocks.
+  # UNTRACED phases, entered per chunk read, switch profiles only; their
+  # allocations count to the phase around them
+
+  UNTRACED = {'receive'}
+
+  def __init__(self):
+    super().__init__()
+    import cProfile
+    for mod in [v for v in globals().values() if isinstance(v, LazyModule)]:
+      mod.__name__
+    self.new_profile = cProfile.Profile
+    self.thread = threading.get_ident()
+    self.profiles = {} # phase -> cProfile.Profile
+    self.entered = {}  # phase -> times entered
+    self.peaks = {}    # phase -> peak bytes over the start of the phase
+    self.allocs = {}   # phase -> {tracemalloc.StatisticDiff.traceback: [size, count]}
+    self.stack = []    # [[phase, start bytes, peak bytes, snapshot, its bytes]]
+    self.own = set()   # (file, line) of enter() and leave(), not of the command
+    for method in (ProfileMetrics.enter, ProfileMetrics.leave):
+      code = method.__code__
+      self.own.update((code.co_filename, line) for (_, _, line) in code.co_lines() if line)
+    tracemalloc.start()
+    self.stack.append(['other', 0, 0, None, 0])
+    self.profile('other').enable()
+
+  def profile(self, name):
+    if name not in self.profiles: self.profiles[name] = self.new_profile()
+    return self.profiles[name]
+
+  def enter(self, name):
+    if threading.get_ident() != self.thread: return
+    self.profile(self.stack[-1][0]).disable()
+    (current, peak) = tracemalloc.get_traced_memory()
+    self.stack[-1][2] = max(self.stack[-1][2], peak)
+    self.entered[name] = self.entered.get(name, 0) + 1
+    if name in self.UNTRACED:
+      self.stack.append([name, None, None, None, 0])
+      self.profile(name).enable()
+      return
+    before = tracemalloc.take_snapshot()
+    # the snapshot is held through the phase, not counted to it or outer ones
+    held = tracemalloc.get_traced_memory()[0] - current
+    self.stack.append([name, current + held, current + held, before, held])
+    tracemalloc.reset_peak()
+    self.profile(name).enable()
+
+  def leave(self, name):
+    if threading.get_ident() != self.thread: return
+    self.profile(name).disable()
+    (_, start, top, before, held) = self.stack.pop()
+    if start is None: # untraced
+      self.profile(self.stack[-1][0]).enable()
+      return
+    (_, peak) = tracemalloc.get_traced_memory()
+    top = max(top, peak)
+    self.peaks[name] = max(self.peaks.get(name, 0), top - start)
+    allocs = self.allocs.setdefault(name, {})
+    for st in tracemalloc.take_snapshot().compare_to(before, 'lineno'):
+      frame = st.traceback[0]
+      if st.size_diff <= 0 or frame.filename == tracemalloc.__file__ \
+          or (frame.filename, frame.lineno) in self.own: continue
+      site = allocs.setdefault(st.traceback, [0, 0])
+      site[0] += st.size_diff
+      site[1] += st.count_diff
+    self.stack[-1][2] = max(self.stack[-1][2], top - held)
+    del before
+    tracemalloc.reset_peak()
+    self.profile(self.stack[-1][0]).enable()
+
+  def phase(self, name):
+    return ProfilePhase(self, name)
+
+  def stop(self):
+    self.profile(self.stack[-1][0]).disable()
+    tracemalloc.stop()
+
+class ProfilePhase(MetricsPhase):
+  # profiling is switched outside of the timed span
+  def __enter__(self):
+    self.metrics.enter(self.name)
+    super().__enter__()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    super().__exit__(exc_type, exc_value, traceback)
+    self.metrics.leave(self.name)
+
+def profile_report(metrics, report, top):
+  # text report of ProfileMetrics: phases, then the functions taking most
+  # time of their own and the sites allocating most, per phase
+  out = [f"'{report['command']}' of '{report['account']}', exit status "
+    f"{report['code']}, {report['seconds']:.3f}s", ""]
+  out.append(f"{'phase':<12}{'seconds':>10}{'entered':>9}{'peak KiB':>11}")
+  for name in [*metrics.phases, 'other']:
+    seconds = f"{metrics.phases[name]:.4f}" if name in metrics.phases else "-"
+    entered = metrics.entered.get(name, "-")
+    peak = f"{metrics.peaks[name] / 1024:.1f}" if name in metrics.peaks else "-"
+    out.append(f"{name:<12}{seconds:>10}{entered:>9}{peak:>11}")
+
+  import pstats
+  for (name, profile) in metrics.profiles.items():
+    stats = pstats.Stats(profile).stats
+    if not stats: continue
+    out += ["", f"[{name}] by own time", f"{'calls':>9}{'own s':>10}{'total s':>10}  function"]
+    for ((path, line, func), (_, calls, own, total, _)) in sorted(stats.items(),
+        key=lambda kv: kv[1][2], reverse=True)[:top]:
+      out.append(f"{calls:>9}{own:>10.4f}{total:>10.4f}  {os.path.basename(path)}:{line}({func})")
+    allocs = metrics.allocs.get(name)
+    if not allocs: continue
+    out += ["", f"[{name}] by allocated size", f"{'KiB':>9}{'blocks':>10}  site"]
+    for (tb, (size, count)) in sorted(allocs.items(), key=lambda kv: kv[1][0], reverse=True)[:top]:
+      out.append(f"{size / 1024:>9.1f}{count:>10}  {tb[0].filename}:{tb[0].lineno}")
+  return "\n".join(out) + "\n"
+
+def replay_server(path):
+  # 'serve --replay path' in a process of its own, off the profiled one;
+  # returns (process, url)
+  import subprocess
+  proc = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+    'serve', '--replay', path, '--port', '0'], stdout=subprocess.PIPE, text=True)
+  line = proc.stdout.readline() # "serving on http://host:port, ..."
+  if not line.startswith("serving on "):
+    proc.wait()
+    exit(3) # reported by serve
+  return (proc, line.split()[2].rstrip(','))
+
+def routine_profile_command(cmd, config_path, opts):
+  if cmd not in BATCH_COMMANDS:
+    print(f"'profile' runs one of {', '.join(BATCH_COMMANDS)}, not '{cmd}'.", file=sys.stderr)
+    exit(1)
+  out = opts.get('out', PROFILE_OUT)
+  try:
+    top = int(opts.get('top', PROFILE_TOP))
+    assert top > 0
+  except (ValueError, AssertionError):
+    print("Invalid '--top', expecting a positive count.", file=sys.stderr)
+    exit(1)
+
+  # runs are not reported as of config, nor do replayed ones touch the
+  # cache and records of the account: they get copies aside
+  config = routine_load_config(config_path)
+  overrides = {'metrics_path': '', 'prom_path': '', 'archive_path': ''}
+  proc = None
+  tmp = tempfile.TemporaryDirectory() if 'replay' in opts else None
+  if tmp:
+    (proc, overrides['server_url']) = replay_server(opts['replay'])
+    import shutil
+    cache = os.path.join(tmp.name, "cache")
+    try:
+      shutil.copyfile(cache_location(config), cache)
+    except OSError:
+      pass # none yet
+    overrides['cache_path'] = cache
+    overrides['store_path'] = os.path.join(tmp.name, "store.sqlite") if config['store_path'] else ''
+
+  metrics = ProfileMetrics()
+  code = 0
+  try:
+    routine_run_command(cmd, config_path, opts, metrics, overrides)
+  except SystemExit as e:
+    code = e.code
+  finally:
+    metrics.stop()
+    if proc:
+      proc.terminate()
+      proc.wait()
+    if tmp: tmp.cleanup()
+
+  import pstats
+  report = profile_report(metrics, metrics.report(config['username'], cmd, code), top)
+  try:
+    stats = pstats.Stats(*metrics.profiles.values())
+    stats.dump_stats(out + ".pstats")
+    for (name, profile) in metrics.profiles.items():
+      profile.dump_stats(f"{out}.{name}.pstats")
+    with open(out + ".txt", "wt") as f:
+      f.write(report)
+  except OSError as e:
+    print(f"Error while writing profile to '{out}'.", file=sys.stderr)
+    print(e, file=sys.stderr)
+    exit(6)
+  print(f"profile written to {out}.pstats, {out}.<phase>.pstats and {out}.txt", file=sys.stderr)
+  exit(code)
+
+def routine_archive_command(cmd, config_path, opts):
+  # emetic archive <list|decode|export> [config_path] [--option value]...
+  if cmd not in ARCHIVE_COMMANDS:
+    print(f"'archive' is one of {', '.join(ARCHIVE_COMMANDS)}, not '{cmd}'.", file=sys.stderr)
+    exit(1)
+  path = opts.get('path') or routine_load_config(config_path)['archive_path']
+  if not path:
+    print("No archive, set 'archive_path' of config or give '--path'.", file=sys.stderr)
+    exit(3)
+  endpoint = opts.get('endpoint')
+  if endpoint is not None and endpoint not in ResponseArchive.ENDPOINTS:
+    print(f"Unknown endpoint '{endpoint}', one of {', '.join(ResponseArchive.ENDPOINTS)}.", file=sys.stderr)
+    exit(1)
+  (fmt, since, limit) = routine_select_output(opts) # since is of archiving here
+
+  start = perf_counter()
+  (n, failed, size) = (0, 0, 0)
+  recs = {} # (account, timestamp) -> record, the last one archived
+  try:
+    archive = ResponseArchive(path.replace("~", os.environ['HOME']))
+    for (ts, account, ep, status, body) in archive.entries(opts.get('account'), endpoint,
+        since and since.timestamp()):
+      when = datetime.fromtimestamp(ts, ZeusRequest.TIME_ZONE).isoformat(timespec='seconds')
+      if cmd == 'list':
+        print(f"{when}\t{account}\t{ep}\t{status}\t{len(body)}")
+        n += 1
+        if n == limit: break
+        continue
+      if status != 200: continue # error pages of the server
+      n += 1
+      size += len(body)
+      try:
+        if ep == 'login':
+          json.loads(urllib.parse.unquote(body.tobytes().decode('utf-8')))
+        elif cmd == 'decode' or ep != 'select':
+          nexacro_ssv_decode(body)
+        else:
+          ret = nexacro_ssv_decode(body, columns={b'dsMain': ZeusRecord.COLUMNS}, raw=True)
+          if b'dsMain' not in ret: continue # refused, e.g. session expired
+          cols = ret[b'dsMain'][0]
+          for i in range(len(cols[ZeusRecord.DATE])):
+            rec = ZeusRecord(cols, i)
+            recs[(account, rec['timestamp'])] = rec
+      except ValueError as e:
+        failed += 1
+        print(f"{when}\t{account}\t{ep}\t{e}", file=sys.stderr if cmd == 'export' else sys.stdout)
+  except OSError as e:
+    print(f"Error while reading response archive '{path}'.", file=sys.stderr)
+    print(e, file=sys.stderr)
+    exit(3)
+
+  if cmd == 'export':
+    if select_header(fmt): print(select_header(fmt, account=True))
+    for (i, key) in enumerate(sorted(recs), 1):
+      print(format_record(recs[key], fmt, key[0]))
+      if i == limit: break
+  if cmd != 'list':
+    print(f"{n} bodies of {size / 2**20:.1f} MiB decoded in {perf_counter() - start:.3f}s,"
+      f" {failed} failed", file=sys.stderr)
+  if failed: exit(7)
+
+
+class ZeusStandIn:
+  # local stand-in of zeus.gist.ac.kr for offline load testing, speaking
+  # the same cookies and SSV/JSON protocol as the four endpoints used here.
+  # any non-empty credential logs in; sessions expire after session_ttl
+  # seconds, answered with ErrorCode 4000 like the real server does.
+
+  def __init__(self, latency=0.0, error_rate=0.0, session_ttl=1800):
+    self.latency = latency
+    self.error_rate = error_rate
+    self.session_ttl = session_ttl
+    self.lock = threading.Lock()
+    self.sessions = {} # ZSESSIONID -> (username, created)
+    self.records = {}  # username -> [(chk_dt, chk_tm, temp, sympts, spc_ctnt)]
+    self.served = {}   # path -> count
+
+  def handle(self, path, cookies, body):
+    # returns (status, headers, body)
+    with self.lock:
+      self.served[path] = self.served.get(path, 0) + 1
+    if self.latency:
+      sleep(random.uniform(0.5, 1.5) * self.latency)
+    if self.error_rate and random.random() < self.error_rate:
+      return (503, [], b"injected error")
+
+    if path == ZeusRequest.LOGIN_PATH.split('?')[0]:
+      return self.login(cookies, body)
+
+    handler = {
+      ZeusRequest.ROLE_PATH: self.role,
+      ZeusRequest.SELECT_PATH: self.select,
+      ZeusRequest.SAVE_PATH: self.save,
+    }.get(path)
+    if handler is None:
+      return (404, [], b"not found")
+
+    info = nexacro_ssv_decode(body)
+    with self.lock:
+      (username, created) = self.sessions.get(cookies.get('ZSESSIONID'), (None, 0))
+    if username is None or datetime.now().timestamp() - created > self.session_ttl \
+        or info.get(b'WMONID', b'').decode('utf-8') != cookies.get('WMONID'):
+      return self.ssv([("ErrorCode:int", 4000), ("ErrorMsg:string", "session expired")])
+    return handler(username, info)
+
+  def login(self, cookies, body):
+    form = urllib.parse.parse_qs(body.decode('utf-8'))
+    username = form.get('login_id', [''])[0]
+    if not username or not form.get('login_pw', [''])[0]:
+      return (200, [], json.dumps({'error_msg': "invalid id or password"}).encode('utf-8'))
+
+    headers = []
+    if 'WMONID' not in cookies:
+      headers.append(('Set-Cookie', f"WMONID={secrets.token_urlsafe(8)}; Path=/"))
+    session = secrets.token_urlsafe(24)
+    headers.append(('Set-Cookie', f"ZSESSIONID={session}; Path=/; HttpOnly"))
+    with self.lock:
+      self.sessions[session] = (username, datetime.now().timestamp())
+    return (200, headers, json.dumps({'error_msg': ""}).encode('utf-8'))
+
+  def role(self, username, info):
+    digits = f"{int.from_bytes(username.encode('utf-8'), 'big') % 10**8:08d}"
+    return self.ssv([], ("dsUserRole",
+      ["USER_ID:STRING(32)", "BASE_DEPT_CD:STRING(8)", "MBR_NO:STRING(8)"],
+      [[username, f"D{digits[:7]}", digits]]))
+
+  def select(self, username, info):
+    month = info.get(b'chk_dt', b'').decode('utf-8')
+    with self.lock:
+      recs = [r for r in self.records.get(username, []) if r[0].startswith(month)]
+    return self.ssv([], ("dsMain", ZEUS_SELECT_COLUMNS, [
+      ["D0000000", username, "00000000", dt, tm, temp,
+        *("Y" if y else "" for y in sympts), spc_ctnt or None, ZeusRequest.SSV_GUBUN, None]
+      for (dt, tm, temp, sympts, spc_ctnt) in recs
+    ]))
+
+  def save(self, username, info):
+    def var(vid): return info.get(vid, b'').decode('utf-8')
+    now = datetime.now(ZeusRequest.TIME_ZONE)
+    rec = (var(b'chk_dt').replace('-', ''), now.strftime('%H:%M'), var(b'temp'),
+      [var(f'sympt_{k}'.encode()) == 'Y' for k in range(1, 7)], var(b'spc_ctnt'))
+    with self.lock:
+      self.records.setdefault(username, []).append(rec)
+    return self.ssv([("ErrorCode:int", 0)])
+
+  def ssv(self, variables, *datasets):
+    # variables [(vid, val)], datasets (did, infos, rows)
+    ssv = NexacroSsvEncoder() # a thread each
+    ssv.begin()
+    for (vid, val) in variables: ssv.variable(vid, val)
+    for (did, infos, rows) in datasets:
+      ssv.dataset(did, infos)
+      for row in rows: ssv.row(row)
+      ssv.end()
+    return (200, [], ssv.getvalue())
+
+
+class ZeusRecorder:
+  # replaces ZeusStandIn in serve command; either relays exchanges to the
+  # upstream server appending them to a JSON-lines file (record), or answers
+  # from such a file (replay), in recorded order per path, cycling at the end
+
+  def __init__(self, path, upstream=None):
+    self.lock = threading.Lock()
+    self.served = {}
+    if upstream is not None:
+      self.upstream = urllib.parse.urlsplit(upstream)
+      self.file = open(path, "at")
+      self.recorded = None
+    else:
+      self.upstream = None
+      self.recorded = {}
+      with open(path, "rt") as f:
+        for line in f:
+          ex = json.loads(line)
+          self.recorded.setdefault(ex['path'], []).append(ex)
+
+  def handle(self, path, cookies, body, method="POST", full_path=None, headers=()):
+    with self.lock:
+      n = self.served.get(path, 0)
+      self.served[path] = n + 1
+
+    if self.recorded is not None:
+      exs = self.recorded.get(path)
+      if not exs:
+        return (404, [], b"not recorded")
+      ex = exs[n % len(exs)]
+      return (ex['status'], [tuple(h) for h in ex['headers']],
+        base64.b64decode(ex['response']))
+
+    cls = http.client.HTTPSConnection if self.upstream.scheme == 'https' else http.client.HTTPConnection
+    conn = cls(self.upstream.netloc)
+    try:
+      headers = [(hf, self.upstream.netloc if hf.lower() == 'host' else hv) for (hf, hv) in headers]
+      conn.putrequest(method, full_path or path, skip_host=True, skip_accept_encoding=True)
+      for (hf, hv) in headers: conn.putheader(hf, hv)
+      conn.endheaders(body)
+      response = conn.getresponse()
+      data = response.read()
+      rheaders = [(hf, hv) for (hf, hv) in response.getheaders()
+        if hf.lower() not in ('content-length', 'transfer-encoding', 'connection')]
+    finally:
+      conn.close()
+
+    with self.lock:
+      json.dump({
+        'time': datetime.now().timestamp(), 'method': method, 'path': path,
+        'full_path': full_path or path, 'headers': rheaders, 'status': response.status,
+        'request': base64.b64encode(body).decode('ascii'),
+        'response': base64.b64encode(data).decode('ascii'),
+      }, self.file)
+      self.file.write("\n")
+      self.file.flush()
+    return (response.status, rheaders, data)
+
+
+class ZeusStandInHandler:
+  # mixed into http.server.BaseHTTPRequestHandler by standin_server
+  protocol_version = "HTTP/1.1" # keep-alive, as the real server
+
+  def do_POST(self):
+    length = int(self.headers.get('Content-Length', 0))
+    body = self.rfile.read(length)
+    cookies = {}
+    for cookie in (self.headers.get('Cookie') or "").split(';'):
+      if '=' in cookie:
+        (cf, cv) = cookie.split('=', 1)
+        cookies[cf.strip()] = cv.strip()
+
+    backend = self.server.backend
+    path = self.path.split('?')[0]
+    if isinstance(backend, ZeusRecorder):
+      (status, headers, data) = backend.handle(path, cookies, body,
+        self.command, self.path, self.headers.items())
+    else:
+      (status, headers, data) = backend.handle(path, cookies, body)
+      # compressed as the real server does, for larger bodies
+      if len(data) >= STANDIN_GZIP_SIZE and 'gzip' in self.headers.get('Accept-Encoding', ''):
+        data = zlib.compress(data, wbits=16 + zlib.MAX_WBITS)
+        headers = headers + [('Content-Encoding', 'gzip')]
+
+    self.send_response(status)
+    for (hf, hv) in headers: self.send_header(hf, hv)
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def log_message(self, format, *args):
+    pass # see the summary printed at exit
+
+def standin_server(backend, host='127.0.0.1', port=0):
+  # returns server bound to (host, port), not yet serving
+  import http.server
+  handler = type('ZeusStandInHandler', (ZeusStandInHandler, http.server.BaseHTTPRequestHandler), {})
+  # backlog as deep as batches connect at once, 5 by default
+  server_class = type('ZeusStandInServer', (http.server.ThreadingHTTPServer,), {'request_queue_size': 256})
+  server = server_class((host, port), handler)
+  server.daemon_threads = True
+  server.backend = backend
+  return server
+
+def routine_serve_command(opts):
+  try:
+    host = opts.get('host', '127.0.0.1')
+    port = int(opts.get('port', 8080))
+    latency = float(opts.get('latency', 0))
+    error_rate = float(opts.get('error-rate', 0))
+    session_ttl = float(opts.get('session-ttl', 1800))
+  except ValueError:
+    print("Invalid serve option.", file=sys.stderr)
+    exit(1)
+
+  try:
+    if 'record' in opts:
+      backend = ZeusRecorder(opts['record'], opts.get('upstream', 'https://' + ZeusRequest.BASE_URL))
+    elif 'replay' in opts:
+      backend = ZeusRecorder(opts['replay'])
+    else:
+      backend = ZeusStandIn(latency, error_rate, session_ttl)
+    server = standin_server(backend, host, port)
+  except (OSError, ValueError, KeyError) as e:
+    print("Error while starting stand-in server.", file=sys.stderr)
+    print(e, file=sys.stderr)
+    exit(3)
+
+  (host, port) = server.server_address[:2]
+  print(f"serving on http://{host}:{port}, set it as 'server_url' of config", flush=True)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+  for (path, n) in sorted(backend.served.items()):
+    print(f"{path}\t{n}")
+
+
+class EmeticDaemon:
+  # keeps a warm ZeusRequest per account, runs 'update' for every account
+  # at the scheduled times, and answers commands on a unix socket
+
+  def __init__(self, accounts, times, jitter):
+    self.accounts = accounts # [(key, config, zrq, lock)]
+    self.times = times       # [(hour, minute)]
+    self.jitter = jitter     # seconds
+    self.sessions = ZeusSessions()
+    self.stop = threading.Event()
+    self.reports = {} # key -> metrics report of the last run
+    self.reports_lock = threading.Lock()
+
+  def find(self, key):
+    for (k, config, zrq, lock) in self.accounts:
+      if key in (k, config['username']): return (config, zrq, lock)
+    return None
+
+  def run(self, config, zrq, lock, cmd, opts={}):
+    # returns (exit status, output lines) of the command
+    out = []
+    quiet = dict(config, verbose=False) # progress would go to the daemon log
+    with lock:
+      zrq.metrics = Metrics()
+      try:
+        # ZeusRequest reconnects if the server has closed idle connection
+        ret = routine_execute_command(zrq, quiet, cmd, ret=True,
+          sessions=self.sessions, opts=opts)
+        with zrq.metrics.phase('cache'):
+          routine_store_cache(zrq.get_cache(), config)
+        code = 0
+      except SystemExit as e:
+        code = e.code
+      except Exception as e:
+        print(f"Error while running '{cmd}' for '{config['username']}': {e!r}", file=sys.stderr)
+        code = 1
+      self.report(config, zrq.metrics.report(config['username'], cmd, code))
+      if code != 0: return (code, out)
+
+    if cmd == 'select':
+      out.extend(select_lines(ret, routine_select_output(opts), header=True))
+    elif cmd == 'check' and config['verbose']:
+      out.append("temperature already recorded" if ret else "no record yet")
+    return (0, out)
+
+  def report(self, config, report):
+    routine_report_metrics(report, config)
+    if not config['prom_path']: return
+    with self.reports_lock:
+      self.reports[(config['username'], report['command'])] = (config['prom_path'], report)
+      reports = [r for (path, r) in self.reports.values() if path == config['prom_path']]
+      routine_write_prom(config['prom_path'], reports)
+
+  def next_slot(self, after):
+    # next of the scheduled times strictly after the datetime
+    day = after.date()
+    while True:
+      for (h, m) in sorted(self.times):
+        t = datetime.combine(day, time(h, m))
+        if t > after: return t
+      day += timedelta(days=1)
+
+  def delayed(self, slot):
+    # when to run for the slot, with random delay
+    return slot + timedelta(seconds=random.uniform(0, self.jitter))
+
+  def schedule(self):
+    # heap of (due, slot, account); the next slot follows the slot that
+    # fired, not its delayed time, so that a slot runs once however late
+    now = datetime.now()
+    heap = []
+    for i in range(len(self.accounts)):
+      slot = self.next_slot(now)
+      heap.append((self.delayed(slot), slot, i))
+    heapq.heapify(heap)
+    while heap:
+      (due, slot, i) = heap[0]
+      if self.stop.wait(max(0, (due - datetime.now()).total_seconds())): return
+      slot = self.next_slot(slot)
+      heapq.heapreplace(heap, (self.delayed(slot), slot, i))
+      (key, config, zrq, lock) = self.accounts[i]
+      threading.Thread(target=self.scheduled, args=(key, config, zrq, lock), daemon=True).start()
+
+  def scheduled(self, key, config, zrq, lock):
+    (code, _) = self.run(config, zrq, lock, 'update')
+    print(f"{datetime.now().isoformat(timespec='seconds')}\t{key}\tupdate\t{code}", flush=True)
+
+class DaemonStderr:
+  # sys.stderr of the daemon; what a thread writes while collecting is
+  # also kept for the client it answers
+
+  def __init__(self, stream):
+    self.stream = stream
+    self.local = threading.local()
+
+  def write(self, s):
+    if getattr(self.local, 'lines', None) is not None: self.local.lines.append(s)
+    return self.stream.write(s)
+
+  def flush(self):
+    self.stream.flush()
+
+  def collect(self):
+    self.local.lines = []
+
+  def collected(self):
+    (lines, self.local.lines) = (self.local.lines, None)
+    return "".join(lines)
+
+class EmeticDaemonHandler:
+  # mixed into socketserver.StreamRequestHandler by routine_daemon_command
+  # one JSON line request {"cmd": .., "config": .., "opts": {..}} per connection,
+  # answered with one JSON line {"code": .., "stdout": [..], "stderr": ".."};
+  # "code" is null for accounts the daemon does not have
+
+  def handle(self):
+    try:
+      req = json.loads(self.rfile.readline())
+      cmd = req['cmd']
+      opts = {k: str(v) for (k, v) in req.get('opts', {}).items()}
+      found = self.server.daemon.find(req['config'])
+    except (ValueError, KeyError, TypeError):
+      return
+    if found is None or cmd not in DAEMON_COMMANDS:
+      resp = {'code': None, 'stdout': [], 'stderr': ""}
+    else:
+      self.server.stderr.collect()
+      try:
+        (code, out) = self.server.daemon.run(*found, cmd, opts)
+      finally:
+        err = self.server.stderr.collected()
+      resp = {'code': code, 'stdout': out, 'stderr': err}
+    self.wfile.write(json.dumps(resp).encode('utf-8') + b"\n")
+
+def daemon_sources(source):
+  # a single config file, or the same sources as batch
+  if os.path.isdir(source) or source == '-' or source.endswith('.jsonl'):
+    for (name, src) in batch_sources(source):
+      yield (os.path.realpath(src) if isinstance(src, str) else name, src)
+  else:
+    yield (os.path.realpath(source), source)
+
+def routine_daemon_command(source, opts):
+  path = opts.get('socket', DEFAULT_SOCKET_PATH)
+  try:
+    times = [tuple(int(x) for x in t.split(':')) for t in opts.get('times', DAEMON_TIMES).split(',')]
+    assert all(len(t) == 2 and 0 <= t[0] < 24 and 0 <= t[1] < 60 for t in times)
+    jitter = float(opts.get('jitter', DAEMON_JITTER))
+  except (ValueError, AssertionError):
+    print("Invalid daemon option.", file=sys.stderr)
+    exit(1)
+
+  accounts = []
+  try:
+    for (key, src) in daemon_sources(source):
+      if isinstance(src, Exception):
+        print(f"Error while reading config of '{key}': {src}.", file=sys.stderr)
+        continue
+      try:
+        config = routine_load_config(src)
+      except SystemExit:
+        continue # reported by routine_load_config
+      zrq = ZeusRequest(routine_load_cache(config), config['server_url'],
+        routine_open_store(config), timeouts=(config['connect_timeout'], config['read_timeout']))
+      zrq.archive = routine_open_archive(config)
+      accounts.append((key, config, zrq, threading.Lock()))
+  except OSError as e:
+    print(f"Error while reading configs at '{source}'.", file=sys.stderr)
+    print(e, file=sys.stderr)
+    exit(3)
+  if not accounts:
+    print("No account to run.", file=sys.stderr)
+    exit(3)
+
+  if os.path.exists(path):
+    try:
+      with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+      print(f"Another daemon is listening on '{path}'.", file=sys.stderr)
+      exit(3)
+    except OSError:
+      os.unlink(path) # left by a daemon which is gone
+
+  daemon = EmeticDaemon(accounts, times, jitter)
+  try:
+    import socketserver
+    handler = type('EmeticDaemonHandler', (EmeticDaemonHandler, socketserver.StreamRequestHandler), {})
+    # created 0600 rather than changed after bind, no moment open to other
+    # users: commands run with the accounts' credentials
+    umask = os.umask(0o177)
+    try:
+      server = socketserver.ThreadingUnixStreamServer(path, handler)
+    finally:
+      os.umask(umask)
+  except OSError as e:
+    print(f"Error while listening on '{path}'.", file=sys.stderr)
+    print(e, file=sys.stderr)
+    exit(3)
+  server.daemon_threads = True
+  server.daemon = daemon
+  sys.stderr = server.stderr = DaemonStderr(sys.stderr)
+
+  signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
+  scheduler = threading.Thread(target=daemon.schedule, daemon=True)
+  scheduler.start()
+  print(f"daemon of {len(accounts)} accounts listening on '{path}'", flush=True)
+  try:
+    # shutdown() from the signal handler must not run on this thread
+    serving = threading.Thread(target=server.serve_forever)
+    serving.start()
+    while serving.is_alive(): serving.join(1)
+  except KeyboardInterrupt:
+    server.shutdown()
+  finally:
+    daemon.stop.set()
+    server.server_close()
+    os.unlink(path)
+    for (_, _, zrq, _) in accounts: zrq.__exit__(None, None, None)
+
+def routine_daemon_client(cmd, config_path, opts):
+  # answers the command with a running daemon; returns False if there is none
+  path = opts.get('socket', DEFAULT_SOCKET_PATH)
+  if cmd not in DAEMON_COMMANDS or config_path == '-' or not os.path.exists(path):
+    return False
+  if cmd == 'select':
+    # reported here, not in the daemon's log
+    routine_select_output(opts)
+    routine_select_months(opts)
+  try:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+      sock.settimeout(DAEMON_TIMEOUT)
+      sock.connect(path)
+      req = {'cmd': cmd, 'config': os.path.realpath(config_path), 'opts': opts}
+      sock.sendall(json.dumps(req).encode('utf-8') + b"\n")
+      with sock.makefile('rb') as f:
+        resp = json.loads(f.readline())
+  except (OSError, ValueError):
+    return False
+  if resp.get('code') is None:
+    return False
+  for line in resp['stdout']: print(line)
+  sys.stderr.write(resp.get('stderr', ""))
+  exit(resp['code'])
+
 
 import os
-import sys
 
 DEFAULT_CONFIG_PATH = os.environ['HOME']+"/.emetic_config"
 DEFAULT_CACHE_PATH  = os.environ['HOME']+"/.emetic_cache"
+DEFAULT_SOCKET_PATH = os.environ['HOME']+"/.emetic_socket"
+DEFAULT_STORE_PATH  = os.environ['HOME']+"/.emetic_store.sqlite"
 
 CONFIG_SCHEME = {
   'verbose': True,
   'username': str,
   'b64_password': str,
   'cache_path': DEFAULT_CACHE_PATH,
+  'cache_backend': 'json',
+  'server_url': 'https://' + ZeusRequest.BASE_URL,
+  'store_path': DEFAULT_STORE_PATH,
+  'local_check': True,
+  'update_mode': 'strict',
+  'speculative_role': True,
+  'archive_path': '',
+  'metrics_path': '',
+  'prom_path': '',
+  'timeout': 60.0,
+  'connect_timeout': ZeusRequest.TIMEOUTS[0],
+  'read_timeout': ZeusRequest.TIMEOUTS[1],
+  'retries': 3,
   'temperature': 36.5,
   'cough': False,
   'sore_throat': False,
@@ -539,23 +3725,167 @@ CONFIG_SCHEME = {
   'other_symptoms': False,
 }
 
+SESSION_MARGIN = 0.9
+RETRY_BACKOFF = 0.5 # seconds, doubled each retry
+RETRY_BACKOFF_MAX = 8.0
+STANDIN_GZIP_SIZE = 1024
+
+SELECT_FORMATS = ['text', 'jsonl', 'csv', 'tsv']
+RECORD_COLUMNS = ['date', 'time', 'temperature', 'symptoms', 'significance']
+
+BATCH_COMMANDS = ['save', 'select', 'check', 'update']
+BATCH_WORKERS = 16
+BATCH_ASYNC_WORKERS = 256 # a socket each, within the usual limit of 1024 files
+BATCH_SLOW = 2.0 # seconds of response taken as overload sign
+
+ARCHIVE_ENTRY = '<dQIHBB' # see ResponseArchive
+ARCHIVE_COMMANDS = ['list', 'decode', 'export']
+
+PROFILE_OUT = 'emetic-profile'
+PROFILE_TOP = 15
+
+DAEMON_COMMANDS = ['select', 'check']
+DAEMON_TIMES = '10:00,20:00'
+DAEMON_JITTER = 100 * 60 # like 'sleep ${RANDOM:0:2}m' of crontab
+DAEMON_TIMEOUT = 120
+
 VERSION_STR = '0.1.0'
 
 HELP_MSG = """
 emeic - upload & view temperature data on zeus.gist.ac.kr
 
 Usage: emetic <command> [config_path]
+       emetic select [config_path] [--from YYYY-MM] [--to YYYY-MM]
+                 [--since YYYY-MM-DD] [--limit N] [--format text|jsonl|csv|tsv]
+       emetic <command>-all <config_dir|configs.jsonl> [--workers N]
+                 [--spread SECONDS] [--rps R] [--connections N] [--slow SECONDS]
+                 [--engine threads|async]
+       emetic profile <command> [config_path] [--replay path]
+                 [--out prefix] [--top N]
+       emetic archive list|decode|export [config_path] [--path archive]
+                 [--account name] [--endpoint name] [--since YYYY-MM-DD]
+                 [--limit N] [--format text|jsonl|csv|tsv]
 
 Commands:
     save	Upload temperature data as configured
-    select	View temperature data of this month
+    select	View temperature data of this month, or of a month range
     check	Check if temperature data has already been uploaded
     update	Upload temperature data only if not have been yet
     config	Create config file with filled with default values
+    bench	Measure SSV codec and request pipeline on synthetic data
+    serve	Run a local stand-in of zeus server for offline testing
+    profile	Run a command under cProfile and tracemalloc, see Profile
+    archive	List, decode or export archived responses, see Archive
+    daemon	Keep logged in and run 'update' on schedule, see Daemon
     version	Print program version
     help	Print this help message
 
   *NOTE* 'check' is glorified 'select'. 'update' is 'check' + 'save'.
+  Exits with 9 when giving up on an unresponsive or failing server,
+  see 'timeout' of Config.
+  Exits with 10 when the server rejects the session even right after
+  logging in again.
+
+  'select' with '--from' and/or '--to' views records of the months in
+  between, fetched concurrently. Months already over when fetched are
+  kept in the local store (see 'store_path') and not fetched again.
+  '--since' leaves out records before the day, fetching from its month
+  unless '--from' is given, and '--limit N' stops after N records.
+  '--format' is 'text'(default), 'jsonl' of an object per record, or
+  'csv' or 'tsv' with a header line. Records are written month by month
+  as they are fetched, so long ranges take no more memory than a month.
+
+Batch:
+  'save-all', 'select-all', 'check-all' and 'update-all' run the command
+  for every account at once on a pool of '--workers' threads (default 16).
+  Accounts are either files in config_dir or lines of configs.jsonl,
+  one JSON config object per line ('-' reads lines from stdin).
+  Each account gets a line '<name> <exit status> <result> <elapsed>',
+  followed by total wall-clock time. Progress messages are suppressed.
+  'select-all' lists records led by the account as its months are
+  fetched, so lines of accounts interleave and no account's history is
+  held whole; with '--format' other than text, the account and total
+  lines go to stderr instead.
+  Exits with 7 if any of the accounts failed.
+  Accounts left with default 'cache_path' get '<cache_path>.<username>',
+  unless 'cache_backend' is 'sqlite'.
+
+  To go easy on the server, '--spread SECONDS' starts accounts evenly
+  over the window, '--rps R' sends at most R requests per second over
+  all accounts and '--connections N' keeps at most N connections open.
+  An account fetches the months of a range, or checks role data, on
+  extra connections only while some of the N are free, otherwise one
+  after another on its own.
+  The rate is halved on 5xx, timeouts or responses slower than '--slow'
+  seconds (default 2.0), and recovers toward R as responses come back.
+    $ emetic update-all dir --spread 1800 --rps 5 --connections 8
+
+  '--engine async' runs every account in one event loop instead of a
+  thread each, '--workers' (default 256) of them at once, for batches of
+  thousands of accounts. '--connections' then caps '--workers'.
+
+Daemon:
+  'daemon' takes a config_path, config_dir or configs.jsonl and stays
+  running, logged in with a warm connection for each account. It runs
+  'update' for every account at '--times' (default 10:00,20:00) with
+  random delay under '--jitter' seconds (default 6000), printing a line
+  per run. 'select' and 'check' of an account are answered through the
+  unix socket at '--socket' (default ~/.emetic_socket) when the daemon
+  is running, without logging in again; otherwise they run as usual.
+  Their errors are printed by the command as well as in the daemon's log.
+
+Bench:
+  'bench' takes no config. It generates a select.do response with
+  '--rows' dsMain records (default 10000) and '--datasets' extra ones
+  (default 4), then reports throughput, peak memory and memory blocks
+  retained by the result of encoding, decoding, select record mapping
+  (then decoding all of the fields, for 'select-fields') and config
+  loading.
+  '--format json' prints the report as JSON. Given a saved report with
+  '--baseline path', exits with 8 when any stage is more than
+  '--tolerance' (default 0.1) slower than in the baseline.
+  '--startup ms' instead measures how much longer than bare python3
+  'version', 'help' and 'config ""' take to run (median of '--repeat',
+  default 11), exiting with 8 when any of them exceeds ms.
+
+Serve:
+  'serve' takes no config. It answers login, role, select and save
+  requests on '--host' (default 127.0.0.1) and '--port' (default 8080)
+  with the cookies and SSV format of zeus, accepting any credential and
+  keeping saved records in memory. Point 'server_url' of config at it.
+  '--latency' adds seconds (+-50%) per request, '--error-rate' answers
+  the fraction of requests with 503, and sessions expire to ErrorCode
+  4000 after '--session-ttl' seconds (default 1800). Bodies of 1 KiB or
+  more are gzip compressed when the request accepts it.
+  '--record path' relays requests to '--upstream' (default zeus) and
+  appends the exchanges to path; '--replay path' answers from them.
+
+Profile:
+  'profile' runs 'save', 'select', 'check' or 'update' of one account
+  under cProfile and tracemalloc, split by phase (login, role, select,
+  decode, ...). It writes '<out>.pstats' of the whole run and
+  '<out>.<phase>.pstats' of each phase, readable by pstats or snakeviz,
+  and '<out>.txt' with seconds and peak memory per phase, and the top
+  '--top' (default 15) functions by own time and allocation sites of
+  each. '--out' defaults to 'emetic-profile'.
+  '--replay path' answers from a recording of 'serve --record' instead
+  of the server, with cache and store copied aside so neither changes.
+  Only the main thread is profiled; lazy imports are done beforehand.
+    $ emetic serve --record rec.jsonl --port 8081  # select once, then
+    $ emetic profile select --replay rec.jsonl
+
+Archive:
+  With 'archive_path' of config set, every response body is appended to
+  the archive as received, keyed by account, endpoint and time, so that
+  responses can be looked into or decoded again without the server.
+  'archive list' prints a line '<time> <account> <endpoint> <status>
+  <bytes>' per body, 'archive decode' decodes every successful body again
+  and prints those failing, and 'archive export' prints the records of
+  archived select responses in '--format', the last one archived of each
+  account and time, led by the account. The archive is that of config,
+  or '--path'. '--account', '--endpoint' and '--since' (archived since)
+  narrow the bodies, '--limit N' the lines printed.
+  Exits with 7 if any of the bodies failed to decode.
 
 Config:
   config_path is optional. If omitted, default path will be used.
@@ -573,6 +3903,50 @@ Config:
     'verbose' enables printing progress to stdout when set(default).
     'cache_path'. cache contains login token cookie, user info, etc.
       emetic logins or querys  per each request when set to ''.
+      It also learns how long the login lasts while idle, so that
+      emetic logs in ahead instead of having a request rejected.
+    'cache_backend' is 'json'(default), a file per account replaced at
+      once on write, or 'sqlite', a database at 'cache_path' (default
+      <cache_path>.sqlite) shared by accounts, keyed by username and
+      read for every account of a batch at once.
+    'store_path' is sqlite database of records uploaded and fetched,
+      shared by accounts. No local store is kept when set to ''.
+    'local_check' lets 'check' and 'update' trust the local store when
+      it has a record of this half-day. Set false to always ask server.
+    'update_mode' 'strict'(default) makes 'update' check the server
+      before saving. 'optimistic' saves right away when the local store
+      has fetched this month yet has no record of this half-day, saving
+      the select; if the server rejects the save, e.g. as a duplicate,
+      'update' checks the server and succeeds if a record is there, and
+      if it accepts with a nonzero ErrorCode, this month is fetched
+      again. A duplicate accepted as plainly as a first record cannot be
+      told apart, so use 'optimistic' only for accounts uploaded to by
+      emetic with this store alone; records uploaded elsewhere since the
+      last fetch get saved again.
+    'speculative_role' sends role.do on a second connection at the
+      same time as the command when logging in again with department
+      and member number cached (default true), instead of before it.
+      Records are fetched again if the department turned out changed;
+      'save' waits for role.do, as it cannot be taken back.
+    'archive_path' is a file response bodies are appended to, with an
+      index at '<archive_path>.idx', see Archive. None kept when set to
+      ''(default). Bodies hold personal data; the files are made private.
+    'metrics_path' is where a JSON line of timings of each phase
+      (connect, login, role, select, save, wait for response headers,
+      receive, decode, config, cache) and counts of requests, bytes, retries and re-logins is
+      appended per run; '-' for stderr. None kept when set to ''(default).
+    'prom_path' is a node-exporter textfile (e.g. in the directory of
+      its --collector.textfile.directory) replaced with the same metrics
+      of the last run of each account. Not written when set to ''.
+    'server_url' is where requests go, e.g. 'http://localhost:8080'
+      for the 'serve' stand-in. Default is https://zeus.gist.ac.kr.
+    'timeout' is seconds a command may take in total (default 60.0),
+      'connect_timeout' and 'read_timeout' bound connecting and each
+      wait for data (default 10.0 and 30.0). Timeouts, 5xx responses
+      and reset connections are tried again up to 'retries' times
+      (default 3) after random exponential delays, within 'timeout'.
+      Then emetic gives up with exit status 9. 'save' is not tried
+      again once it may have reached the server; 'update' checks first.
 
   *NOTE* setting 'verbose':false does not prevent emetic to report
     error messages to stderr. Also, 'select' and 'help' commands
@@ -585,10 +3959,14 @@ Examples:
     $ emetic select                  # view records with default cfg
     $ emetic check - < path/to/cfg   # check if upload needed
     $ emetic update paht/to/cfg      # upload data if needed
+    $ emetic update-all path/to/dir  # upload for every cfg in dir
+    $ emetic bench --format json > base.json   # later compare with
+    $ emetic bench --baseline base.json        #   a new revision
 
   *NOTE* you can use separate cfg for two students on a same machine
 
-  To make emetic run regularly, you may use cron(8) service.
+  To make emetic run regularly, you may run `emetic daemon` as a
+  service or use cron(8) service.
   `$ crontab -e` then paste following lines to the opened editor.
     SHELL=/bin/bash
     0 10 * * * sleep ${RANDOM:0:2}m; emetic update
@@ -598,8 +3976,8 @@ Examples:
 """
 
 
-if __name__ == "__main__":
-  (cmd, config_path) = routine_args(sys.argv)
+def main(argv):
+  (cmd, config_path, opts) = routine_args(argv)
   if cmd == 'config':
     routine_config_command(config_path)
     exit(0)
@@ -609,9 +3987,65 @@ if __name__ == "__main__":
   if cmd == 'help':
     print(HELP_MSG)
     exit(0)
+  if cmd == 'bench':
+    routine_bench_command(opts)
+    exit(0)
+  if cmd == 'serve':
+    routine_serve_command(opts)
+    exit(0)
+  if cmd == 'archive':
+    # emetic archive <list|decode|export> [config_path] [--option value]...
+    routine_archive_command(*routine_args(argv[1:]))
+    exit(0)
+  if cmd == 'profile':
+    # emetic profile <command> [config_path] [--option value]...
+    routine_profile_command(*routine_args(argv[1:]))
+    exit(0)
 
-  config = routine_load_config(config_path)
-  cache  = routine_load_cache(config)
-  with ZeusRequest(cache) as zrq:
-    routine_execute_command(zrq, config, cmd)
-    routine_store_cache(zrq.get_cache(), config)
+  if cmd == 'daemon':
+    routine_daemon_command(config_path, opts)
+    exit(0)
+  routine_daemon_client(cmd, config_path, opts)
+
+  if cmd.endswith('-all') and cmd[:-4] in BATCH_COMMANDS:
+    if config_path == DEFAULT_CONFIG_PATH:
+      print(f"'{cmd}' needs config_dir or configs.jsonl.", file=sys.stderr)
+      exit(1)
+    routine_batch_command(cmd[:-4], config_path, opts)
+    exit(0)
+
+  routine_run_command(cmd, config_path, opts, Metrics())
+
+def routine_run_command(cmd, config_path, opts, metrics, overrides={}):
+  # runs cmd for the account of config_path, overrides replacing its config
+  with metrics.phase('config'):
+    config = routine_load_config(config_path)
+  config.update(overrides)
+  if cmd == 'select' and opts.get('format', 'text') != 'text':
+    config['verbose'] = False # stdout is records only
+  code = 0
+  try:
+    with ZeusRequest({}, config['server_url'], routine_open_store(config), metrics,
+        (config['connect_timeout'], config['read_timeout'])) as zrq:
+      zrq.archive = routine_open_archive(config)
+      if not answered_locally(cmd, config, zrq.store):
+        zrq.preconnect() # handshake while cache is read
+      with metrics.phase('cache'):
+        zrq.set_cache(routine_load_cache(config))
+      routine_execute_command(zrq, config, cmd, opts=opts)
+      with metrics.phase('cache'):
+        routine_store_cache(zrq.get_cache(), config)
+  except SystemExit as e:
+    code = e.code
+    raise
+  except BaseException:
+    code = 1
+    raise
+  finally:
+    report = metrics.report(config['username'], cmd, code)
+    routine_report_metrics(report, config)
+    if config['prom_path']: routine_write_prom(config['prom_path'], [report])
+
+
+if __name__ == "__main__":
+  main(sys.argv)